@@ -1,10 +1,29 @@
 #!/usr/bin/env python3
+import hashlib
 import os
 import platform
 import subprocess
 import sys
+import time
 from pathlib import Path
 
+LAUNCH_TIME = time.time()
+
+# Optimisations ; -march=native est retiré si le compilateur ne le connaît pas
+OPTIMIZATION_FLAGS = ["-O3", "-march=native"]
+
+def build_command(source: Path, output: Path, flags: list) -> list:
+    if platform.system() == "Windows":
+        return ["gcc", "-shared", "-pthread", *flags, str(source), "-o", str(output)]
+    else:  # Unix-like systems
+        return ["cc", "-shared", "-fPIC", "-pthread", *flags, str(source), "-o", str(output)]
+
+def build_stamp(source: Path, command: list) -> str:
+    # Empreinte de la source et de la commande de compilation
+    digest = hashlib.sha256(source.read_bytes())
+    digest.update("\0".join(command).encode())
+    return digest.hexdigest()
+
 def compile_c_code():
     source = Path("src/functions.c")
     if not source.exists():
@@ -14,39 +33,49 @@ def compile_c_code():
     # Create shared directory if it doesn't exist
     Path("shared").mkdir(exist_ok=True)
 
-    if platform.system() == "Windows":
-        output = Path("shared/functions.dll")
-        compile_command = ["gcc", "-shared", str(source), "-o", str(output)]
-    else:  # Unix-like systems
-        output = Path("shared/functions.so")
-        compile_command = ["cc", "-shared", "-fPIC", str(source), "-o", str(output)]
+    output = Path("shared/functions.dll" if platform.system() == "Windows" else "shared/functions.so")
+    stamp_path = Path("shared/functions.stamp")
 
-    try:
-        result = subprocess.run(compile_command, capture_output=True, text=True)
-        if result.returncode != 0:
-            print("Compilation failed:", result.stderr)
-            return False
+    # La bibliothèque n'est recompilée que si la source ou les options ont changé
+    commands = [build_command(source, output, flags)
+                for flags in (OPTIMIZATION_FLAGS, [flag for flag in OPTIMIZATION_FLAGS if flag != "-march=native"])]
+    stamps = [build_stamp(source, command) for command in commands]
+    if output.exists() and stamp_path.exists() and stamp_path.read_text() in stamps:
         return True
-    except Exception as e:
-        print("Compilation error:", e)
-        return False
+
+    for compile_command, stamp in zip(commands, stamps):
+        try:
+            result = subprocess.run(compile_command, capture_output=True, text=True)
+        except Exception as e:
+            print("Compilation error:", e)
+            return False
+        if result.returncode == 0:
+            stamp_path.write_text(stamp)
+            return True
+    print("Compilation failed:", result.stderr)
+    return False
 
 def launch_main():
+    # Heure de lancement, pour les temps de démarrage affichés en mode debug
+    env = dict(os.environ, TOWNSEARCHER_LAUNCH_TIME=repr(LAUNCH_TIME))
     if platform.system() == "Windows":
         # Hide console window on Windows
         startupinfo = subprocess.STARTUPINFO()
         startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
         startupinfo.wShowWindow = subprocess.SW_HIDE
-        subprocess.Popen([sys.executable, "src/main.py"], 
-                        startupinfo=startupinfo, 
-                        creationflags=subprocess.CREATE_NO_WINDOW)
+        subprocess.Popen([sys.executable, "src/main.py"],
+                        startupinfo=startupinfo,
+                        creationflags=subprocess.CREATE_NO_WINDOW,
+                        env=env)
     else:
         # Unix-like systems
-        subprocess.Popen([sys.executable, "src/main.py"])
+        subprocess.Popen([sys.executable, "src/main.py"], env=env)
 
 if __name__ == "__main__":
     os.chdir(Path(__file__).parent)  # Set working directory to script location
     if compile_c_code():
+        if os.environ.get('TOWNSEARCHER_DEBUG'):
+            print(f"Bibliothèque prête en {(time.time() - LAUNCH_TIME) * 1000:.0f} ms")
         launch_main()
     else:
         print("Failed to launch application due to compilation errors")
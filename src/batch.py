@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# Correction en masse de noms de communes depuis un CSV :
+#   python src/batch.py adresses.csv --column ville --countries France Suisse -o resultats.csv
+# Le fichier est lu par paquets de lignes, chaque paquet est traité par un processus du pool
+# (un appel C par pays pour tout le paquet) et les résultats sont écrits au fil de l'eau,
+# dans l'ordre du fichier, avec au plus quelques paquets en mémoire.
+import argparse
+import csv
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from engine import COMMUNES_FILES, SearchEngine
+
+OUTPUT_COLUMNS = ['rang', 'correspondance', 'distance', 'Pays', 'dep_code']
+
+engine = None  # Moteur du processus courant, créé par init_worker
+
+
+def init_worker(countries: list, min_distance: int) -> None:
+    global engine
+    from native import functions_lib
+    # Le parallélisme vient du pool de processus : un seul thread C par processus
+    functions_lib.set_thread_count(1)
+    engine = SearchEngine(min_distance=min_distance)
+    engine.select(countries)
+
+
+def match_chunk(names: list, k: int) -> list:
+    # Les noms vides ne sont pas cherchés : leurs colonnes de correspondance restent vides
+    queries = [name for name in names if name]
+    matches = iter(engine.match(queries, k) if queries else [])
+    return [next(matches) if name else [] for name in names]
+
+
+def read_chunks(reader, column: int, chunk_size: int):
+    # (lignes, noms) par paquets de chunk_size lignes
+    while True:
+        rows = list(islice(reader, chunk_size))
+        if not rows:
+            return
+        yield rows, [row[column].strip() if column < len(row) else '' for row in rows]
+
+
+def write_matches(writer, rows: list, matches: list) -> None:
+    for row, row_matches in zip(rows, matches):
+        if not row_matches:
+            writer.writerow(row + ['', '', '', '', ''])
+        for rank, (name, distance, pays, dep_code) in enumerate(row_matches, start=1):
+            writer.writerow(row + [rank, name, distance, pays, dep_code])
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} n'est pas un entier positif")
+    return number
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Associe chaque nom de commune d'un CSV aux communes les plus proches.")
+    parser.add_argument('input', help="CSV d'entrée (avec en-tête), '-' pour l'entrée standard")
+    parser.add_argument('-o', '--output', default='-', help="CSV de sortie, '-' pour la sortie standard")
+    parser.add_argument('-c', '--column', default=None, help="Colonne des noms (par défaut la première)")
+    parser.add_argument('--countries', nargs='+', default=['France'], choices=list(COMMUNES_FILES), help="Pays")
+    parser.add_argument('-k', '--top', type=positive_int, default=1, help="Nombre de correspondances par nom")
+    parser.add_argument('--max-distance', type=int, default=15, help="Distance de Levenshtein maximale (exclue)")
+    parser.add_argument('--chunk-size', type=positive_int, default=2000, help="Lignes par paquet")
+    parser.add_argument('-j', '--workers', type=positive_int, default=os.cpu_count() or 1, help="Processus de calcul")
+    parser.add_argument('--delimiter', default=',')
+    args = parser.parse_args(argv)
+
+    # Cache de chaque pays construit ici, une fois : les processus du pool ne font que le mapper
+    SearchEngine().view_for(args.countries)
+
+    input_file = sys.stdin if args.input == '-' else open(args.input, newline='', encoding='utf-8-sig')  # BOM des exports de tableurs
+    output_file = sys.stdout if args.output == '-' else open(args.output, 'w', newline='', encoding='utf-8')
+    reader = csv.reader(input_file, delimiter=args.delimiter)
+    writer = csv.writer(output_file, delimiter=args.delimiter)
+
+    header = next(reader, [])
+    if header:
+        header[0] = header[0].lstrip('\ufeff')  # BOM sur l'entrée standard
+    if args.column and args.column not in header:
+        parser.error(f"colonne {args.column!r} absente de l'en-tête ({', '.join(header)})")
+    column = header.index(args.column) if args.column else 0
+    writer.writerow(header + OUTPUT_COLUMNS)
+
+    processed = 0
+    start = last_report = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                             initargs=(args.countries, args.max_distance)) as pool:
+        # Au plus deux paquets en cours par processus : la mémoire reste bornée
+        pending = deque()
+        chunks = read_chunks(reader, column, args.chunk_size)
+        for rows, names in chunks:
+            pending.append((rows, pool.submit(match_chunk, names, args.top)))
+            while len(pending) >= 2 * args.workers or (pending and pending[0][1].done()):
+                rows, future = pending.popleft()
+                write_matches(writer, rows, future.result())
+                processed += len(rows)
+            if time.perf_counter() - last_report >= 1:
+                last_report = time.perf_counter()
+                print(f"{processed} lignes, {processed / (last_report - start):.0f} lignes/s", file=sys.stderr)
+        while pending:
+            rows, future = pending.popleft()
+            write_matches(writer, rows, future.result())
+            processed += len(rows)
+
+    elapsed = time.perf_counter() - start
+    print(f"{processed} lignes en {elapsed:.2f} s, {processed / elapsed if elapsed else 0:.0f} lignes/s", file=sys.stderr)
+    if output_file is not sys.stdout:
+        output_file.close()
+    if input_file is not sys.stdin:
+        input_file.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# Banc d'essai sans interface : rejoue des sessions de frappe (un nom de commune tapé lettre par
+# lettre, avec quelques fautes) pour chaque type de recherche, avec et sans correction, et chaque
+# combinaison de pays, puis donne le débit et les percentiles de latence de chaque cas.
+# Les sessions sont tirées des CSV avec une graine fixe : deux exécutions rejouent les mêmes requêtes.
+#   python src/benchmark.py --sessions 20 --json bench.json
+#   python src/benchmark.py --compare bench.json --timing
+#   python src/benchmark.py --startup   # temps de démarrage à froid et à chaud
+import argparse
+import json
+import os
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from engine import SEARCH_TYPES, SearchEngine
+
+COUNTRY_COMBINATIONS = [('France',), ('Allemagne',), ('Suisse',), ('France', 'Allemagne', 'Suisse')]
+
+
+def misspell(name: str, rng: random.Random, typo_rate: float) -> str:
+    # Quelques fautes de frappe : lettre remplacée, oubliée ou doublée
+    typed = []
+    for char in name:
+        if rng.random() >= typo_rate:
+            typed.append(char)
+            continue
+        typo = rng.randrange(3)
+        if typo == 0:
+            typed.append(rng.choice(string.ascii_lowercase))
+        elif typo == 2:
+            typed.append(char * 2)
+    return ''.join(typed)
+
+
+def typing_sessions(engine: SearchEngine, countries: tuple, count: int, seed: int, typo_rate: float) -> list:
+    # [[requête après chaque frappe], ...] pour `count` noms tirés parmi les pays
+    names = []
+    for country in countries:
+        names.extend(name.decode('utf-8') for name in engine.load(country).columns['nom_standard'].values())
+    rng = random.Random(f'{seed}-{"-".join(countries)}')
+    sessions = []
+    for _ in range(count):
+        typed = misspell(rng.choice(names), rng, typo_rate)
+        sessions.append([typed[:length] for length in range(1, len(typed) + 1) if typed[:length].strip()])
+    return sessions
+
+
+def run_case(engine: SearchEngine, countries: tuple, mode: str, correction: bool, sessions: list, page_size: int) -> dict:
+    engine.select(countries)
+    engine.search(sessions[0][0], mode, correction).page(0, page_size)  # Clés de tri de la vue
+    with engine.filter_cache_lock:
+        engine.filter_cache.clear()
+    if engine.timer:
+        engine.timer.reset()
+
+    latencies = []
+    start = time.perf_counter()
+    for session in sessions:
+        for query in session:
+            started = time.perf_counter()
+            engine.search(query, mode, correction).page(0, page_size)
+            latencies.append(time.perf_counter() - started)
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+    case = {
+        'mode': mode,
+        'correction': correction,
+        'countries': list(countries),
+        'searches': len(latencies),
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'mean_ms': float(latencies.mean()),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+    }
+    if engine.timer:
+        case['stages'] = engine.timing_stats()
+    return case
+
+
+# Démarrage mesuré dans un nouvel interpréteur : import du moteur, chargement des pays et première
+# recherche, comme le fait le thread de recherche de l'application
+STARTUP_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+from engine import SearchEngine
+imported = time.perf_counter()
+engine = SearchEngine(cache_dir=sys.argv[1])
+view = engine.view_for(('France', 'Allemagne', 'Suisse'))
+loaded = time.perf_counter()
+engine.search('', 'Contenant', view=view).page(0, 10)
+searched = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'load_ms': (loaded - imported) * 1000,
+                  'first_search_ms': (searched - loaded) * 1000, 'total_ms': (searched - started) * 1000}))
+'''
+
+
+def startup_times() -> dict:
+    # {'build': {cold, warm}, 'cold': {...}, 'warm': {...}} : compilation sans puis avec l'empreinte à
+    # jour (launch.py), puis démarrage sans cache des pays (CSV lus avec pandas) et avec
+    root = Path(__file__).resolve().parent.parent
+    sys.path.insert(0, str(root))
+    from launch import OPTIMIZATION_FLAGS, build_command, compile_c_code
+
+    times = {}
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        subprocess.run(build_command(root / 'src' / 'functions.c', Path(directory) / 'functions.so', OPTIMIZATION_FLAGS),
+                       capture_output=True, check=True)
+        cold_build = time.perf_counter() - started
+        cwd = os.getcwd()
+        os.chdir(root)
+        try:
+            compile_c_code()  # Met l'empreinte à jour si besoin
+            started = time.perf_counter()
+            compile_c_code()
+            warm_build = time.perf_counter() - started
+        finally:
+            os.chdir(cwd)
+        times['build'] = {'cold_ms': cold_build * 1000, 'warm_ms': warm_build * 1000}
+
+        for start in ('cold', 'warm'):
+            output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, directory], cwd=Path(__file__).parent,
+                                    capture_output=True, text=True, check=True).stdout
+            times[start] = json.loads(output)
+    return times
+
+
+def case_key(case: dict) -> tuple:
+    return case['mode'], case['correction'], tuple(case['countries'])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Banc d'essai des recherches (sessions de frappe rejouées).")
+    parser.add_argument('--sessions', type=int, default=10, help="Sessions de frappe par cas")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--typo-rate', type=float, default=0.05, help="Probabilité d'une faute par lettre")
+    parser.add_argument('--modes', nargs='+', default=list(SEARCH_TYPES), choices=SEARCH_TYPES)
+    parser.add_argument('--correction', choices=('off', 'on', 'both'), default='both')
+    parser.add_argument('--page-size', type=int, default=10, help="Résultats convertis par recherche, comme une page de l'interface")
+    parser.add_argument('--timing', action='store_true', help="Temps par étape de chaque cas")
+    parser.add_argument('--json', help="Écrit les résultats dans ce fichier")
+    parser.add_argument('--compare', help="Résultats JSON d'une exécution précédente, pour comparer les p50")
+    parser.add_argument('--startup', action='store_true', help="Mesure seulement les temps de démarrage à froid et à chaud")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        times = startup_times()
+        print(f"compilation      froid {times['build']['cold_ms']:8.1f} ms  chaud {times['build']['warm_ms']:8.1f} ms")
+        for stage in ('import_ms', 'load_ms', 'first_search_ms', 'total_ms'):
+            print(f"{stage[:-3]:16} froid {times['cold'][stage]:8.1f} ms  chaud {times['warm'][stage]:8.1f} ms")
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as file:
+                json.dump(times, file, indent=2)
+        return 0
+
+    engine = SearchEngine()
+    if args.timing:
+        engine.enable_timing()
+    corrections = {'off': [False], 'on': [True], 'both': [False, True]}[args.correction]
+    previous = {}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            previous = {case_key(case): case for case in json.load(file)}
+
+    cases = []
+    for countries in COUNTRY_COMBINATIONS:
+        sessions = typing_sessions(engine, countries, args.sessions, args.seed, args.typo_rate)
+        for mode in args.modes:
+            for correction in corrections:
+                case = run_case(engine, countries, mode, correction, sessions, args.page_size)
+                cases.append(case)
+                line = (f"{mode:15} {'correction' if correction else '':10} {'+'.join(countries):25} "
+                        f"{case['searches']:6} recherches {case['throughput']:8.0f}/s "
+                        f"p50 {case['p50_ms']:7.2f} ms  p99 {case['p99_ms']:7.2f} ms")
+                if case_key(case) in previous:
+                    line += f"  (p50 x{case['p50_ms'] / previous[case_key(case)]['p50_ms']:.2f})"
+                print(line, flush=True)
+                for stage, stats in case.get('stages', {}).items():
+                    print(f"    {stage:12} {stats['count']:6} x {stats['mean_ms']:7.3f} ms  max {stats['max_ms']:7.2f} ms")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(cases, file, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
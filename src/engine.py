@@ -0,0 +1,292 @@
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+
+from native import functions_lib, size_t_p
+from store import CACHE_DIR, CodepointColumn, CommuneStore, StoreView, codepoints, fold, load_store, phonetic_fold
+from timing import StageTimer
+
+ROOT = Path(__file__).resolve().parent.parent
+COMMUNES_FILES = {country: str(ROOT / 'communes' / f'{country}.csv') for country in ('France', 'Allemagne', 'Suisse')}
+
+SEARCH_TYPES = ("Commencant par", "Finissant par", "Contenant", "Phonétique")
+SORT_TYPES = ("Nom", "Longueur", "Département", "Distance")
+# Clé de tri précalculée de chaque type de tri (voir CommuneStore.SORT_KEYS), hors distance
+SORT_KEYS = {"Nom": 'name', "Longueur": 'length', "Département": 'dep_code'}
+
+
+class SearchResults:
+    # Résultats d'une recherche : lignes de la vue et distances, triées. Seules les lignes
+    # demandées (page) sont converties en objets Python.
+    def __init__(self, view: StoreView, rows: np.ndarray, distances: np.ndarray, timer: StageTimer = None):
+        self.view = view
+        self.rows = rows
+        self.distances = distances
+        self.timer = timer
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def page(self, start: int = 0, stop: int = None) -> list:
+        # [(Pays, nom_standard, dep_code, distance), ...] des résultats start à stop
+        timer = self.timer
+        if timer:
+            started = time.perf_counter()
+        frame = self.view.frame(self.rows[start:stop])
+        page = list(zip(frame['Pays'], frame['nom_standard'], frame['dep_code'], self.distances[start:stop].tolist()))
+        if timer:
+            timer.lap('page', started)
+        return page
+
+
+class SearchEngine:
+    # Moteur de recherche sans interface : chargement des pays, sélection, recherche et
+    # lettres suivantes. Utilisable depuis l'application Tk comme depuis un service.
+    def __init__(self, communes_files: dict = None, cache_dir: str = CACHE_DIR,
+                 min_distance: int = 15, max_suggestions: int = 20, filter_cache_size: int = 32):
+        self.communes_files = dict(communes_files or COMMUNES_FILES)
+        self.cache_dir = cache_dir
+        self.loaded_stores = {}
+        self.load_lock = threading.Lock()
+        self.view = StoreView([])
+        self.views = {}  # StoreView par tuple de pays, pour réutiliser leurs clés de tri
+
+        self.min_distance = min_distance  # Minimum Levenshtein distance to consider
+        self.max_suggestions = max_suggestions  # Maximum number of suggestions to add
+
+        # Matching rows of the recent queries, keyed by (query, search type, countries), least recent first
+        self.filter_cache = OrderedDict()
+        self.filter_cache_size = filter_cache_size
+        self.filter_cache_lock = threading.Lock()
+
+        # Per-stage timings (see enable_timing), None when disabled
+        self.timer = None
+
+    def enable_timing(self) -> None:
+        if self.timer is None:
+            self.timer = StageTimer()
+
+    def disable_timing(self) -> None:
+        self.timer = None
+
+    def timing_stats(self) -> dict:
+        # {stage: {count, total_ms, mean_ms, max_ms}}, empty when timing is disabled
+        timer = self.timer
+        return timer.stats() if timer else {}
+
+    @property
+    def countries(self) -> list:
+        return list(self.communes_files)
+
+    def load(self, country: str) -> CommuneStore:
+        # Les pays sont chargés à leur première sélection
+        with self.load_lock:
+            if country not in self.loaded_stores:
+                timer = self.timer
+                if timer:
+                    started = time.perf_counter()
+                self.loaded_stores[country] = load_store(self.communes_files[country], self.cache_dir)
+                if timer:
+                    timer.lap('load', started)
+            return self.loaded_stores[country]
+
+    def view_for(self, countries) -> StoreView:
+        countries = tuple(countries)
+        if countries not in self.views:
+            self.views[countries] = StoreView([self.load(country) for country in countries])
+        return self.views[countries]
+
+    def select(self, countries) -> None:
+        self.view = self.view_for(countries)
+
+    def search(self, query: str, mode: str = "Contenant", correction: bool = False, sort: str = "Nom",
+               ascending: bool = True, limit: int = None, cancel=None, view: StoreView = None) -> SearchResults:
+        # Returns None if `cancel` (ctypes.c_int) was set during the search
+        view = self.view if view is None else view
+        timer = self.timer
+        if timer:
+            started = time.perf_counter()
+        rows = self.filter_rows(query, mode, cancel, view)
+        if timer:
+            started = timer.lap('filter', started)
+        if correction:
+            nearest_rows, _ = self.correction(query, self.min_distance, self.max_suggestions, cancel, view)
+            rows = np.concatenate([rows, nearest_rows])
+            if timer:
+                started = timer.lap('correction', started)
+        if cancel is not None and cancel.value:
+            return None
+
+        # One row per name (its first occurrence), then distances for the remaining rows only
+        rows = self.unique_names(rows, view)
+        if timer:
+            started = timer.lap('dedup', started)
+        distances = self.distances(query, rows, cancel, view)
+        if timer:
+            started = timer.lap('distances', started)
+        if cancel is not None and cancel.value:
+            return None
+
+        order = self.sort_results(rows, distances, sort, ascending, view)[:limit]
+        results = SearchResults(view, rows[order], distances[order], timer)
+        if timer:
+            timer.lap('sort', started)
+        return results
+
+    @staticmethod
+    def unique_names(rows: np.ndarray, view: StoreView) -> np.ndarray:
+        # `rows` without the rows whose name already appeared earlier in `rows`
+        ranks = view.sort_key('name')[rows]
+        order = np.argsort(ranks, kind='stable')
+        sorted_ranks = ranks[order]
+        first = order[np.append(True, sorted_ranks[1:] != sorted_ranks[:-1])] if len(rows) else order
+        return rows[np.sort(first)]
+
+    @staticmethod
+    def sort_results(rows: np.ndarray, distances: np.ndarray, sort_type: str, ascending: bool, view: StoreView) -> np.ndarray:
+        # Positions of `rows` in `sort_type` order (stable, unknown types keep the order), from the precomputed keys
+        if sort_type == "Distance":
+            keys = distances
+        elif sort_type in SORT_KEYS:
+            keys = view.sort_key(SORT_KEYS[sort_type])[rows]
+        else:
+            return np.arange(len(rows))
+        return np.argsort(keys if ascending else -keys.astype(np.int64), kind='stable')
+
+    def next_letters(self, query: str, view: StoreView = None) -> list:
+        # Caractères (repliés, voir fold) pouvant suivre `query` au début d'un nom
+        view = self.view if view is None else view
+        possible_letters = set()
+        if query:
+            for store, _ in view.stores:
+                possible_letters.update(store.next_letters(fold(query)))
+        return sorted(possible_letters)
+
+    def distances(self, query: str, rows: np.ndarray = None, cancel=None, view: StoreView = None) -> np.ndarray:
+        # Levenshtein distance (in characters, between folded names) to `query` for the given rows of the view (every row if None)
+        view = self.view if view is None else view
+        query_codepoints = codepoints(fold(query))
+        if rows is None:
+            rows = np.arange(len(view), dtype=np.uintp)
+        distances = np.zeros(len(rows), dtype=np.uintp)
+        for store, _, mask, local_rows in view.split(rows):
+            local_distances = np.zeros(len(local_rows), dtype=np.uintp)
+            functions_lib.calculate_final_distances(store.folded.arena_ptr, store.folded.offsets_ptr,
+                                                    local_rows.ctypes.data_as(size_t_p), len(local_rows),
+                                                    query_codepoints.ctypes.data, len(query_codepoints),
+                                                    local_distances.ctypes.data_as(size_t_p), cancel)
+            distances[mask] = local_distances
+        return distances
+
+    def correction(self, query: str, min_distance: int, max_suggestions: int, cancel=None, view: StoreView = None) -> tuple:
+        # (rows, distances) of the max_suggestions names nearest to `query`, under min_distance
+        view = self.view if view is None else view
+        query_codepoints = codepoints(fold(query))
+        nearest_rows, nearest_distances = [], []
+        for store, base in view.stores:
+            top_rows = np.empty(max_suggestions, dtype=np.uintp)
+            top_distances = np.empty(max_suggestions, dtype=np.uintp)
+            count = functions_lib.calculate_nearest(store.folded.arena_ptr, store.folded.offsets_ptr, None, len(store),
+                                                    query_codepoints.ctypes.data, len(query_codepoints), min_distance, max_suggestions,
+                                                    top_rows.ctypes.data_as(size_t_p), top_distances.ctypes.data_as(size_t_p), cancel)
+            nearest_rows.append(top_rows[:count] + base)
+            nearest_distances.append(top_distances[:count])
+
+        # Keep the max_suggestions nearest over all countries, ties by row as within a country
+        rows = np.concatenate(nearest_rows) if nearest_rows else np.empty(0, dtype=np.uintp)
+        distances = np.concatenate(nearest_distances) if nearest_distances else np.empty(0, dtype=np.uintp)
+        order = np.lexsort((rows, distances))[:max_suggestions]
+        return rows[order], distances[order]
+
+    def nearest_batch(self, queries: list, k: int = 1, max_distance: int = None, cancel=None) -> tuple:
+        # (rows, distances, counts) of the k names nearest to each query, under max_distance:
+        # rows and distances are (len(queries), k) arrays whose first counts[q] entries are valid.
+        # Each country costs one C call for the whole batch.
+        view = self.view
+        max_distance = self.min_distance if max_distance is None else max_distance
+        queries_column = CodepointColumn.from_strings([fold(query) for query in queries])
+        queries_count = len(queries)
+        invalid = np.iinfo(np.uint64).max
+        keys = [np.full((queries_count, k), invalid, dtype=np.uint64)]
+        for store, base in view.stores:
+            top_rows = np.empty((queries_count, k), dtype=np.uintp)
+            top_distances = np.empty((queries_count, k), dtype=np.uintp)
+            top_counts = np.empty(queries_count, dtype=np.uintp)
+            functions_lib.calculate_nearest_batch(store.folded.arena_ptr, store.folded.offsets_ptr, len(store),
+                                                  queries_column.arena_ptr, queries_column.offsets_ptr, queries_count,
+                                                  max_distance, k, top_rows.ctypes.data_as(size_t_p),
+                                                  top_distances.ctypes.data_as(size_t_p), top_counts.ctypes.data_as(size_t_p), cancel)
+            # Merge the countries on (distance, row), packed into one sortable key
+            valid = np.arange(k) < top_counts[:, None]
+            keys.append(np.where(valid, top_distances.astype(np.uint64) * (len(view) + 1) + top_rows + base, invalid))
+        keys = np.sort(np.concatenate(keys, axis=1), axis=1)[:, :k]
+        counts = (keys != invalid).sum(axis=1)
+        return (keys % (len(view) + 1)).astype(np.uintp), (keys // (len(view) + 1)).astype(np.uintp), counts
+
+    def match(self, queries: list, k: int = 1, max_distance: int = None, cancel=None) -> list:
+        # For each query, [(nom_standard, distance, Pays, dep_code), ...] of its k nearest names
+        rows, distances, counts = self.nearest_batch(queries, k, max_distance, cancel)
+        valid = np.arange(k) < counts[:, None]
+        frame = self.view.frame(rows[valid])
+        matches = list(zip(frame['nom_standard'], distances[valid].tolist(), frame['Pays'], frame['dep_code']))
+        bounds = np.concatenate([[0], np.cumsum(counts)]).tolist()
+        return [matches[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def filter_rows(self, query: str, search_type: str, cancel=None, view: StoreView = None) -> np.ndarray:
+        # Rows of the view whose folded name matches the folded query, reusing the recent queries' results
+        view = self.view if view is None else view
+        query = phonetic_fold(query) if search_type == "Phonétique" else fold(query)
+        key = (query, search_type, view.countries())
+        with self.filter_cache_lock:
+            if key in self.filter_cache:
+                self.filter_cache.move_to_end(key)
+                return self.filter_cache[key]
+            subset = self.cached_superset(*key)
+
+        filtered_indices = []
+        for store, base in view.stores:
+            # Une requête qui prolonge une requête en cache ne peut correspondre qu'à ses résultats
+            if subset is not None:
+                rows = subset[(subset >= base) & (subset < base + len(store))] - base
+                filtered_indices.append(store.filter(query, search_type, rows, cancel) + base)
+                continue
+
+            # Préfixes et suffixes : intervalle des index triés, sans vérification
+            if search_type == "Commencant par":
+                filtered_indices.append(store.starting_with(query) + base)
+            elif search_type == "Finissant par":
+                filtered_indices.append(store.ending_with(query) + base)
+            elif search_type == "Phonétique":
+                # Une seule recherche dans la table des clés phonétiques
+                filtered_indices.append(store.sounding_like(query) + base)
+            else:
+                # "Contenant" : on ne vérifie que les lignes contenant tous les trigrammes de la requête
+                filtered_indices.append(store.filter(query, search_type, store.containing_candidates(query), cancel) + base)
+
+        # Collect results
+        rows = np.concatenate(filtered_indices) if filtered_indices else np.empty(0, dtype=np.uintp)
+        if cancel is not None and cancel.value:
+            return rows  # Partial results, not cached
+        with self.filter_cache_lock:
+            self.filter_cache[key] = rows
+            while len(self.filter_cache) > self.filter_cache_size:
+                self.filter_cache.popitem(last=False)
+        return rows
+
+    def cached_superset(self, query: str, search_type: str, countries: tuple) -> np.ndarray:
+        # Smallest cached result that must contain every match of `query`, or None
+        if search_type == "Phonétique":
+            return None  # A longer query does not keep the phonetic key
+        extends = {
+            "Commencant par": query.startswith,
+            "Finissant par": query.endswith,
+            "Contenant": query.__contains__,
+        }[search_type]
+        superset = None
+        for (cached_query, cached_search_type, cached_countries), rows in self.filter_cache.items():
+            if cached_search_type == search_type and cached_countries == countries and extends(cached_query):
+                if superset is None or len(rows) < len(superset):
+                    superset = rows
+        return superset
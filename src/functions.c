@@ -1,104 +1,564 @@
 #include <string.h>
 #include <stdlib.h>
 #include <stdint.h>
+#include <pthread.h>
 
-// Returns a size_t, depicting the difference between `a` and `b`.
-// See <https://en.wikipedia.org/wiki/Levenshtein_distance> for more information.
-size_t levenshtein_n(const char *a, const size_t length, const char *b, const size_t bLength) {
-  // Shortcut optimizations / degenerate cases.
-  if (a == b) {return 0;}
-  if (!length) {return bLength;}
-  if (!bLength) {return length;}
-
-  size_t *cache = calloc(length, sizeof(size_t));
-  size_t index = 0;size_t bIndex = 0;
-  size_t distance;size_t bDistance;size_t result;
-  char code;
-
-  while (index < length) {
-    cache[index] = index + 1;
-    index++;
+// The name columns are passed as a contiguous arena of NUL-terminated strings plus an
+// offsets array of names_count + 1 entries: name i starts at arena + offsets[i].
+// The sorted indexes use UTF-8 arenas; the scans use the folded names (case-folded,
+// accent-stripped) as fixed-width codepoints, so that one name is one comparison and the
+// distances count characters rather than bytes.
+#define NAME_AT(arena, offsets, i) ((arena) + (offsets)[i])
+#define NAME_LEN(offsets, i) ((offsets)[(i) + 1] - (offsets)[i] - 1)
+
+typedef uint32_t codepoint_t;
+
+// Levenshtein distance between `a` and `b` if it is at most `bound`, `bound + 1` otherwise.
+// Only the diagonal band |i - j| <= bound of the DP is computed (Ukkonen), and the computation
+// stops as soon as a whole row exceeds `bound`. `row` must hold `bLength + 1` entries.
+static size_t levenshtein_bounded(const codepoint_t *a, const size_t length, const codepoint_t *b, const size_t bLength, size_t bound, size_t *row) {
+  const size_t infinity = bound + 1;
+  if ((length > bLength ? length - bLength : bLength - length) > bound) {return infinity;}
+
+  for (size_t j = 0; j <= bLength; j++) {
+    row[j] = j <= bound ? j : infinity;
+  }
+
+  for (size_t i = 1; i <= length; i++) {
+    const size_t low = i > bound ? i - bound : 1;
+    const size_t high = i + bound < bLength ? i + bound : bLength;
+    size_t diagonal = row[low - 1];
+    size_t left = low == 1 && i <= bound ? i : infinity;
+    size_t row_min = left;
+    row[low - 1] = left;
+
+    for (size_t j = low; j <= high; j++) {
+      size_t up = row[j];
+      size_t value = diagonal + (a[i - 1] != b[j - 1]);
+      if (up + 1 < value) {value = up + 1;}
+      if (left + 1 < value) {value = left + 1;}
+      if (value > infinity) {value = infinity;}
+      diagonal = up;
+      row[j] = left = value;
+      if (value < row_min) {row_min = value;}
+    }
+    if (high < bLength) {row[high + 1] = infinity;}
+    if (row_min > bound) {return infinity;}
   }
+  return row[bLength];
+}
+
+// Bit-parallel Levenshtein distance (Myers 1999, Hyyrö's global-distance variant) for queries
+// of at most 64 characters: the query's match bitmasks are computed once, then each name costs
+// a handful of word operations per character instead of a DP row. Codepoints below 256 have a
+// direct table; the (rare) others are looked up among the query's own characters.
+#define MYERS_MAX_LEN 64
+
+typedef struct {
+    uint64_t peq[256];
+    codepoint_t extra[MYERS_MAX_LEN];
+    uint64_t extra_peq[MYERS_MAX_LEN];
+    size_t extra_count;
+    size_t length;
+} myers_pattern_t;
+
+static uint64_t *myers_peq_slot(myers_pattern_t *pattern, codepoint_t c) {
+    if (c < 256) {return &pattern->peq[c];}
+    for (size_t i = 0; i < pattern->extra_count; i++) {
+        if (pattern->extra[i] == c) {return &pattern->extra_peq[i];}
+    }
+    pattern->extra[pattern->extra_count] = c;
+    pattern->extra_peq[pattern->extra_count] = 0;
+    return &pattern->extra_peq[pattern->extra_count++];
+}
+
+static uint64_t myers_peq(const myers_pattern_t *pattern, codepoint_t c) {
+    if (c < 256) {return pattern->peq[c];}
+    for (size_t i = 0; i < pattern->extra_count; i++) {
+        if (pattern->extra[i] == c) {return pattern->extra_peq[i];}
+    }
+    return 0;
+}
+
+static void myers_prepare(myers_pattern_t *pattern, const codepoint_t *query, size_t query_len) {
+    memset(pattern->peq, 0, sizeof(pattern->peq));
+    pattern->extra_count = 0;
+    for (size_t i = 0; i < query_len; i++) {
+        *myers_peq_slot(pattern, query[i]) |= (uint64_t)1 << i;
+    }
+    pattern->length = query_len;
+}
+
+// Distance between the prepared query and `text` if it is at most `bound`, `bound + 1` otherwise
+// (the score can drop by at most one per remaining character, which allows an early exit).
+static size_t myers_distance(const myers_pattern_t *pattern, const codepoint_t *text, size_t text_len, size_t bound) {
+    const size_t length = pattern->length;
+    if (!length) {return text_len <= bound ? text_len : bound + 1;}
+
+    const uint64_t last = (uint64_t)1 << (length - 1);
+    uint64_t pv = length == MYERS_MAX_LEN ? ~(uint64_t)0 : ((uint64_t)1 << length) - 1;
+    uint64_t mv = 0;
+    size_t score = length;
+
+    for (size_t i = 0; i < text_len; i++) {
+        const uint64_t eq = myers_peq(pattern, text[i]);
+        const uint64_t xv = eq | mv;
+        const uint64_t xh = (((eq & pv) + pv) ^ pv) | eq;
+        uint64_t ph = mv | ~(xh | pv);
+        uint64_t mh = pv & xh;
+        if (ph & last) {
+            score++;
+        } else if (mh & last) {
+            score--;
+        }
+        ph = (ph << 1) | 1;
+        mh <<= 1;
+        pv = mh | ~(xv | ph);
+        mv = ph & xv;
+        if (score > bound && score - bound > text_len - i - 1) {return bound + 1;}
+    }
+    return score <= bound ? score : bound + 1;
+}
+
+typedef struct {
+    size_t distance;
+    size_t row;
+} nearest_t;
+
+// Orders candidates by distance, then by row so that ties keep the first rows.
+static int nearest_greater(nearest_t a, nearest_t b) {
+    return a.distance != b.distance ? a.distance > b.distance : a.row > b.row;
+}
+
+static void heap_sift_down(nearest_t *heap, size_t count, size_t index) {
+    while (2 * index + 1 < count) {
+        size_t child = 2 * index + 1;
+        if (child + 1 < count && nearest_greater(heap[child + 1], heap[child])) {child++;}
+        if (!nearest_greater(heap[child], heap[index])) {break;}
+        nearest_t swap = heap[index]; heap[index] = heap[child]; heap[child] = swap;
+        index = child;
+    }
+}
+
+static void heap_sift_up(nearest_t *heap, size_t index) {
+    while (index > 0) {
+        size_t parent = (index - 1) / 2;
+        if (!nearest_greater(heap[index], heap[parent])) {break;}
+        nearest_t swap = heap[index]; heap[index] = heap[parent]; heap[parent] = swap;
+        index = parent;
+    }
+}
+
+// Multi-threaded scans: the row range is split into contiguous chunks, one per worker thread,
+// and each chunk writes to its own slice of the outputs so that results do not depend on
+// the number of threads. The calling thread processes the last chunk itself.
+// The scans also take an optional `cancel` flag, polled every CANCEL_CHECK_ROWS rows: once the
+// caller sets it, the scan stops early and its (partial) results are meant to be discarded.
+#define MIN_ROWS_PER_CHUNK 4096
+#define MAX_THREADS 64
+#define CANCEL_CHECK_ROWS 256
+#define CANCELLED(cancel, i) ((cancel) && (i) % CANCEL_CHECK_ROWS == 0 && *(cancel))
+
+static size_t thread_count = 1;
+
+void set_thread_count(size_t count) {
+    thread_count = count < 1 ? 1 : count > MAX_THREADS ? MAX_THREADS : count;
+}
+
+size_t get_thread_count(void) {
+    return thread_count;
+}
+
+typedef void (*chunk_body_t)(void *context, size_t chunk, size_t begin, size_t end);
+
+typedef struct {
+    chunk_body_t body;
+    void *context;
+    size_t chunk;
+    size_t begin;
+    size_t end;
+} chunk_task_t;
+
+static void *run_chunk(void *argument) {
+    chunk_task_t *task = argument;
+    task->body(task->context, task->chunk, task->begin, task->end);
+    return NULL;
+}
+
+// Number of chunks (at most MAX_THREADS) for `count` items, at least `min_per_chunk` per chunk.
+// Callers compute it once and pass it to `parallel_for`, sizing their per-chunk outputs with the
+// same value even if `set_thread_count` is called meanwhile.
+static size_t chunk_count(size_t count, size_t min_per_chunk) {
+    const size_t threads = thread_count;
+    size_t chunks = count / min_per_chunk;
+    if (chunks > threads) {chunks = threads;}
+    return chunks < 1 ? 1 : chunks;
+}
+
+// Runs `body` on `chunks` contiguous slices of 0..count, as returned by chunk_count.
+static void parallel_for(size_t count, size_t chunks, chunk_body_t body, void *context) {
+    if (chunks <= 1) {
+        body(context, 0, 0, count);
+        return;
+    }
+
+    chunk_task_t tasks[MAX_THREADS];
+    pthread_t threads[MAX_THREADS];
+    int started[MAX_THREADS];
+    for (size_t chunk = 0; chunk < chunks; chunk++) {
+        tasks[chunk].body = body;
+        tasks[chunk].context = context;
+        tasks[chunk].chunk = chunk;
+        tasks[chunk].begin = count * chunk / chunks;
+        tasks[chunk].end = count * (chunk + 1) / chunks;
+    }
+    for (size_t chunk = 0; chunk + 1 < chunks; chunk++) {
+        started[chunk] = pthread_create(&threads[chunk], NULL, run_chunk, &tasks[chunk]) == 0;
+        if (!started[chunk]) {run_chunk(&tasks[chunk]);}
+    }
+    run_chunk(&tasks[chunks - 1]);
+    for (size_t chunk = 0; chunk + 1 < chunks; chunk++) {
+        if (started[chunk]) {pthread_join(threads[chunk], NULL);}
+    }
+}
 
-  while (bIndex < bLength) {
-    code = b[bIndex];
-    result = distance = bIndex++;
-    index = SIZE_MAX;
+typedef struct {
+    const codepoint_t *names;
+    const size_t *offsets;
+    const size_t *rows;
+    const codepoint_t *query;
+    size_t query_len;
+    const myers_pattern_t *pattern;
+    size_t max_distance;
+    size_t k;
+    nearest_t *chunk_top;   // k entries per chunk
+    size_t *chunk_counts;
+    const volatile int *cancel;
+} nearest_context_t;
 
-    while (++index < length) {
-      bDistance = code == a[index] ? distance : distance + 1;
-      distance = cache[index];
+// Pushes the rows begin..end of `rows` (or of every row when `rows` is NULL) nearer to `query`
+// than `max_distance` into the max-heap `heap` of at most `k` entries, and returns its size.
+// `pattern` is the prepared query if it fits in MYERS_MAX_LEN characters, NULL otherwise (then
+// `dp_row` must hold query_len + 1 entries).
+static size_t nearest_scan(const codepoint_t *names, const size_t *offsets, const size_t *rows, size_t begin, size_t end,
+                           const codepoint_t *query, size_t query_len, const myers_pattern_t *pattern,
+                           size_t max_distance, size_t k, nearest_t *heap, size_t *dp_row, const volatile int *cancel) {
+    size_t count = 0;
 
-      cache[index] = result = distance > result
-        ? bDistance > result
-          ? result + 1
-          : bDistance
-        : bDistance > distance
-          ? distance + 1
-          : bDistance;
-  }}
-  free(cache);
-  return result;
+    for (size_t i = begin; i < end && !CANCELLED(cancel, i - begin); i++) {
+        nearest_t candidate;
+        candidate.row = rows ? rows[i] : i;
+        // Once the heap is full, a row must at least tie its worst distance (and win on row)
+        size_t bound = count < k ? max_distance - 1 : heap[0].distance;
+        const codepoint_t *name = NAME_AT(names, offsets, candidate.row);
+        const size_t name_len = NAME_LEN(offsets, candidate.row);
+        if ((name_len > query_len ? name_len - query_len : query_len - name_len) > bound) {continue;}
+        candidate.distance = pattern ? myers_distance(pattern, name, name_len, bound)
+                                     : levenshtein_bounded(name, name_len, query, query_len, bound, dp_row);
+        if (candidate.distance > bound) {continue;}
+
+        if (count < k) {
+            heap[count] = candidate;
+            heap_sift_up(heap, count++);
+        } else if (nearest_greater(heap[0], candidate)) {
+            heap[0] = candidate;
+            heap_sift_down(heap, count, 0);
+        }
+    }
+    return count;
 }
 
-size_t levenshtein(const char *a, const char *b) {
-  const size_t length = strlen(a);
-  const size_t bLength = strlen(b);
+static void nearest_chunk(void *argument, size_t chunk, size_t begin, size_t end) {
+    const nearest_context_t *context = argument;
+    size_t *dp_row = context->pattern ? NULL : malloc((context->query_len + 1) * sizeof(size_t));
+    context->chunk_counts[chunk] = nearest_scan(context->names, context->offsets, context->rows, begin, end,
+                                                context->query, context->query_len, context->pattern,
+                                                context->max_distance, context->k, context->chunk_top + chunk * context->k,
+                                                dp_row, context->cancel);
+    free(dp_row);
+}
 
-  return levenshtein_n(a, length, b, bLength);
+static int compare_nearest(const void *a, const void *b) {
+    const nearest_t *first = a, *second = b;
+    return nearest_greater(*first, *second) - nearest_greater(*second, *first);
 }
 
-void calculate_distances(const char **names, size_t names_count, const char *query, size_t *distances, size_t min_distance, size_t max_suggestions) {
-    size_t *temp_distances = malloc(names_count * sizeof(size_t));
-    size_t suggestions_count = 0;
+// Finds, among the rows of `rows` (or every row when `rows` is NULL), the `k` names nearest to
+// `query` with a distance below `max_distance`. They are written to `top_rows`/`top_distances`
+// sorted by distance (ties by row) and their count is returned. Each chunk keeps its top-k in a
+// max-heap whose worst distance bounds the DP of its following rows; the chunks' top-k are then
+// merged.
+size_t calculate_nearest(const codepoint_t *names, const size_t *offsets, const size_t *rows, size_t rows_count,
+                         const codepoint_t *query, size_t query_len, size_t max_distance, size_t k,
+                         size_t *top_rows, size_t *top_distances, const volatile int *cancel) {
+    if (k == 0 || max_distance == 0) {return 0;}
+    const size_t chunks = chunk_count(rows_count, MIN_ROWS_PER_CHUNK);
+    myers_pattern_t pattern;
+    nearest_context_t context = {names, offsets, rows, query, query_len, NULL, max_distance, k,
+                                 malloc(chunks * k * sizeof(nearest_t)), calloc(chunks, sizeof(size_t)), cancel};
+    if (context.query_len <= MYERS_MAX_LEN) {
+        myers_prepare(&pattern, query, context.query_len);
+        context.pattern = &pattern;
+    }
+
+    parallel_for(rows_count, chunks, nearest_chunk, &context);
 
-    for (size_t i = 0; i < names_count; i++) {
-        temp_distances[i] = levenshtein(names[i], query);
+    // Gather the chunks' candidates and keep the k best
+    size_t count = 0;
+    for (size_t chunk = 0; chunk < chunks; chunk++) {
+        memmove(context.chunk_top + count, context.chunk_top + chunk * k, context.chunk_counts[chunk] * sizeof(nearest_t));
+        count += context.chunk_counts[chunk];
+    }
+    qsort(context.chunk_top, count, sizeof(nearest_t), compare_nearest);
+    if (count > k) {count = k;}
+    for (size_t i = 0; i < count; i++) {
+        top_rows[i] = context.chunk_top[i].row;
+        top_distances[i] = context.chunk_top[i].distance;
     }
+    free(context.chunk_counts);
+    free(context.chunk_top);
+    return count;
+}
+
+typedef struct {
+    const codepoint_t *names;
+    const size_t *offsets;
+    size_t names_count;
+    const codepoint_t *queries;
+    const size_t *query_offsets;
+    size_t max_distance;
+    size_t k;
+    size_t *top_rows;
+    size_t *top_distances;
+    size_t *top_counts;
+    const volatile int *cancel;
+} nearest_batch_context_t;
+
+static void nearest_batch_chunk(void *argument, size_t chunk, size_t begin, size_t end) {
+    const nearest_batch_context_t *context = argument;
+    const size_t k = context->k;
+    nearest_t *heap = malloc(k * sizeof(nearest_t));
+    myers_pattern_t pattern;
+    (void)chunk;
+
+    for (size_t q = begin; q < end && !(context->cancel && *context->cancel); q++) {
+        const codepoint_t *query = NAME_AT(context->queries, context->query_offsets, q);
+        const size_t query_len = NAME_LEN(context->query_offsets, q);
+        const int bit_parallel = query_len <= MYERS_MAX_LEN;
+        size_t *dp_row = bit_parallel ? NULL : malloc((query_len + 1) * sizeof(size_t));
+        if (bit_parallel) {myers_prepare(&pattern, query, query_len);}
 
-    for (size_t i = 0; i < names_count; i++) {
-        if (temp_distances[i] < min_distance && suggestions_count < max_suggestions) {
-            distances[suggestions_count++] = temp_distances[i];
+        size_t count = nearest_scan(context->names, context->offsets, NULL, 0, context->names_count,
+                                    query, query_len, bit_parallel ? &pattern : NULL,
+                                    context->max_distance, k, heap, dp_row, context->cancel);
+        // Pop the heap from the worst to the best
+        context->top_counts[q] = count;
+        for (size_t n = count; n > 0; n--) {
+            context->top_rows[q * k + n - 1] = heap[0].row;
+            context->top_distances[q * k + n - 1] = heap[0].distance;
+            heap[0] = heap[n - 1];
+            heap_sift_down(heap, n - 1, 0);
         }
+        free(dp_row);
     }
+    free(heap);
+}
 
-    free(temp_distances);
-}
-
-void calculate_final_distances(const char **names, size_t names_count, const char *query, size_t *distances) {
-    for (size_t i = 0; i < names_count; i++) {
-        distances[i] = levenshtein(names[i], query);
-    }
-}
-
-void filter_df(const char **names, const char **names_sans_accent, const char **names_majuscule, size_t names_count, const char *query, const char *search_type, int *results) {
-    for (size_t i = 0; i < names_count; i++) {
-        if (strcmp(search_type, "Commencant par") == 0) {
-            if (strncmp(names[i], query, strlen(query)) == 0 ||
-                strncmp(names_sans_accent[i], query, strlen(query)) == 0 ||
-                strncmp(names_majuscule[i], query, strlen(query)) == 0) {
-                results[i] = 1;
-            } else {
-                results[i] = 0;
-            }
-        } else if (strcmp(search_type, "Finissant par") == 0) {
-            size_t name_len = strlen(names[i]);
-            size_t query_len = strlen(query);
-            if ((name_len >= query_len && strcmp(names[i] + name_len - query_len, query) == 0) ||
-                (name_len >= query_len && strcmp(names_sans_accent[i] + name_len - query_len, query) == 0) ||
-                (name_len >= query_len && strcmp(names_majuscule[i] + name_len - query_len, query) == 0)) {
-                results[i] = 1;
-            } else {
-                results[i] = 0;
-            }
-        } else { // Contenant
-            if (strstr(names[i], query) != NULL ||
-                strstr(names_sans_accent[i], query) != NULL ||
-                strstr(names_majuscule[i], query) != NULL) {
-                results[i] = 1;
-            } else {
-                results[i] = 0;
-            }
+// calculate_nearest for a batch of queries, passed like the names as an (arena, offsets) pair:
+// the k nearest rows of query q are written to top_rows/top_distances[q * k ...] and their
+// count to top_counts[q]. The queries, not the rows, are split across the worker threads.
+void calculate_nearest_batch(const codepoint_t *names, const size_t *offsets, size_t names_count,
+                             const codepoint_t *queries, const size_t *query_offsets, size_t queries_count,
+                             size_t max_distance, size_t k, size_t *top_rows, size_t *top_distances, size_t *top_counts,
+                             const volatile int *cancel) {
+    if (k == 0 || max_distance == 0) {
+        memset(top_counts, 0, queries_count * sizeof(size_t));
+        return;
+    }
+    nearest_batch_context_t context = {names, offsets, names_count, queries, query_offsets, max_distance, k,
+                                       top_rows, top_distances, top_counts, cancel};
+    parallel_for(queries_count, chunk_count(queries_count, 1), nearest_batch_chunk, &context);
+}
+
+typedef struct {
+    const codepoint_t *names;
+    const size_t *offsets;
+    const size_t *rows;
+    const codepoint_t *query;
+    size_t query_len;
+    const myers_pattern_t *pattern;
+    size_t *distances;
+    const volatile int *cancel;
+} distances_context_t;
+
+static void distances_chunk(void *argument, size_t chunk, size_t begin, size_t end) {
+    const distances_context_t *context = argument;
+    size_t *dp_row = context->pattern ? NULL : malloc((context->query_len + 1) * sizeof(size_t));
+    (void)chunk;
+    for (size_t i = begin; i < end && !CANCELLED(context->cancel, i - begin); i++) {
+        size_t row = context->rows ? context->rows[i] : i;
+        const codepoint_t *name = NAME_AT(context->names, context->offsets, row);
+        const size_t name_len = NAME_LEN(context->offsets, row);
+        // Long queries: a full (unbounded) DP, the bound being the largest possible distance
+        context->distances[i] = context->pattern
+            ? myers_distance(context->pattern, name, name_len, SIZE_MAX - 1)
+            : levenshtein_bounded(name, name_len, context->query, context->query_len,
+                                  name_len > context->query_len ? name_len : context->query_len, dp_row);
+    }
+    free(dp_row);
+}
+
+// Computes the distance of each row of `rows` (or of every row when `rows` is NULL).
+void calculate_final_distances(const codepoint_t *names, const size_t *offsets, const size_t *rows, size_t rows_count,
+                               const codepoint_t *query, size_t query_len, size_t *distances, const volatile int *cancel) {
+    myers_pattern_t pattern;
+    distances_context_t context = {names, offsets, rows, query, query_len, NULL, distances, cancel};
+    if (context.query_len <= MYERS_MAX_LEN) {
+        myers_prepare(&pattern, query, context.query_len);
+        context.pattern = &pattern;
+    }
+    parallel_for(rows_count, chunk_count(rows_count, MIN_ROWS_PER_CHUNK), distances_chunk, &context);
+}
+
+enum {SEARCH_STARTING, SEARCH_ENDING, SEARCH_CONTAINING};
+
+typedef struct {
+    const codepoint_t *names;
+    const size_t *offsets;
+    const size_t *rows;
+    const codepoint_t *query;
+    size_t query_len;
+    int search;
+    size_t *matches;
+    size_t *chunk_counts;
+    const volatile int *cancel;
+} filter_context_t;
+
+static int row_matches(const filter_context_t *context, size_t row) {
+    const codepoint_t *name = NAME_AT(context->names, context->offsets, row);
+    const size_t name_len = NAME_LEN(context->offsets, row);
+    const codepoint_t *query = context->query;
+    const size_t query_len = context->query_len;
+    if (query_len > name_len) {return 0;}
+    if (context->search == SEARCH_STARTING) {
+        return memcmp(name, query, query_len * sizeof(codepoint_t)) == 0;
+    } else if (context->search == SEARCH_ENDING) {
+        return memcmp(name + name_len - query_len, query, query_len * sizeof(codepoint_t)) == 0;
+    }
+    if (!query_len) {return 1;}
+    for (size_t i = 0; i + query_len <= name_len; i++) {
+        if (name[i] == query[0] && memcmp(name + i + 1, query + 1, (query_len - 1) * sizeof(codepoint_t)) == 0) {return 1;}
+    }
+    return 0;
+}
+
+// Each chunk writes its matches at the start of its own slice of `matches`
+static void filter_chunk(void *argument, size_t chunk, size_t begin, size_t end) {
+    const filter_context_t *context = argument;
+    size_t count = 0;
+    for (size_t i = begin; i < end && !CANCELLED(context->cancel, i - begin); i++) {
+        size_t row = context->rows ? context->rows[i] : i;
+        if (row_matches(context, row)) {
+            context->matches[begin + count++] = row;
+        }
+    }
+    context->chunk_counts[chunk] = count;
+}
+
+// Keeps the rows of `rows` (or every row when `rows` is NULL) whose folded name matches the
+// folded `query`. Matching rows are written to `matches`, in order, and their count is
+// returned. `matches` must have room for `rows_count` rows.
+size_t filter_df(const codepoint_t *names, const size_t *offsets, const size_t *rows, size_t rows_count,
+                 const codepoint_t *query, size_t query_len, const char *search_type, size_t *matches,
+                 const volatile int *cancel) {
+    const size_t chunks = chunk_count(rows_count, MIN_ROWS_PER_CHUNK);
+    filter_context_t context = {names, offsets, rows, query, query_len, SEARCH_CONTAINING, matches,
+                                calloc(chunks, sizeof(size_t)), cancel};
+    if (strcmp(search_type, "Commencant par") == 0) {
+        context.search = SEARCH_STARTING;
+    } else if (strcmp(search_type, "Finissant par") == 0) {
+        context.search = SEARCH_ENDING;
+    }
+
+    parallel_for(rows_count, chunks, filter_chunk, &context);
+
+    // Pack the chunks' matches, in row order
+    size_t matches_count = 0;
+    for (size_t chunk = 0; chunk < chunks; chunk++) {
+        memmove(matches + matches_count, matches + rows_count * chunk / chunks, context.chunk_counts[chunk] * sizeof(size_t));
+        matches_count += context.chunk_counts[chunk];
+    }
+    free(context.chunk_counts);
+    return matches_count;
+}
+
+// Compares the first `prefix_len` bytes of `name` with `prefix`, `name` being NUL-terminated.
+static int compare_prefix(const char *name, const char *prefix, size_t prefix_len) {
+    return strncmp(name, prefix, prefix_len);
+}
+
+// `order` lists the rows sorted by name (byte order). Sets [*first, *last) to the positions
+// of `order` whose name starts with `prefix`.
+void prefix_range(const char *names, const size_t *offsets, const size_t *order, size_t names_count,
+                  const char *prefix, size_t prefix_len, size_t *first, size_t *last) {
+    size_t low = 0, high = names_count;
+    while (low < high) {
+        size_t middle = low + (high - low) / 2;
+        if (compare_prefix(NAME_AT(names, offsets, order[middle]), prefix, prefix_len) < 0) {
+            low = middle + 1;
+        } else {
+            high = middle;
         }
     }
-}
\ No newline at end of file
+    *first = low;
+
+    high = names_count;
+    while (low < high) {
+        size_t middle = low + (high - low) / 2;
+        if (compare_prefix(NAME_AT(names, offsets, order[middle]), prefix, prefix_len) <= 0) {
+            low = middle + 1;
+        } else {
+            high = middle;
+        }
+    }
+    *last = low;
+}
+
+// Length in bytes of the UTF-8 character starting with `lead`.
+static size_t utf8_char_len(unsigned char lead) {
+    if (lead < 0x80) {return 1;}
+    if ((lead & 0xE0) == 0xC0) {return 2;}
+    if ((lead & 0xF0) == 0xE0) {return 3;}
+    if ((lead & 0xF8) == 0xF0) {return 4;}
+    return 1;
+}
+
+// Writes to `letters` every distinct character following `prefix` in the names of `order`
+// (sorted by name), concatenated in byte order, and returns the number of bytes written.
+// Each distinct next character costs one binary search, not a scan of the matching names.
+size_t next_letters(const char *names, const size_t *offsets, const size_t *order, size_t names_count,
+                    const char *prefix, size_t prefix_len, char *letters, size_t letters_size) {
+    size_t position, last, letters_len = 0;
+    prefix_range(names, offsets, order, names_count, prefix, prefix_len, &position, &last);
+
+    while (position < last) {
+        const char *name = NAME_AT(names, offsets, order[position]);
+        size_t name_len = NAME_LEN(offsets, order[position]);
+        if (name_len == prefix_len) { // The prefix itself sorts first
+            position++;
+            continue;
+        }
+        size_t letter_len = utf8_char_len((unsigned char)name[prefix_len]);
+        if (prefix_len + letter_len > name_len || letters_len + letter_len > letters_size) {
+            break;
+        }
+        memcpy(letters + letters_len, name + prefix_len, letter_len);
+        letters_len += letter_len;
+
+        // Skip every name sharing `prefix` + this letter
+        size_t next_first, next_last;
+        prefix_range(names, offsets, order + position, last - position, name, prefix_len + letter_len, &next_first, &next_last);
+        position += next_last;
+    }
+    return letters_len;
+}
@@ -1,28 +1,14 @@
-import pandas as pd
+import os
+import time
+STARTED = time.time()
 import tkinter as tk
 from tkinter import ttk
-import threading
-import ctypes
-import os
-import platform
-from icecream import ic
-
 
-# Load the shared library into ctypes
-if platform.system() == "Windows":
-    functions_lib = ctypes.CDLL('./shared/functions.dll')
-else:  # Unix-like systems
-    functions_lib = ctypes.CDLL('./shared/functions.so')
+from scheduler import SearchScheduler
 
-# Define the argument and return types for the C functions
-functions_lib.calculate_distances.argtypes = [ctypes.POINTER(ctypes.c_char_p), ctypes.c_size_t, ctypes.c_char_p, ctypes.POINTER(ctypes.c_size_t), ctypes.c_size_t, ctypes.c_size_t]
-functions_lib.calculate_distances.restype = None
+# Instant de lancement (launch.py), pour les temps de démarrage affichés en mode debug
+LAUNCH_TIME = float(os.environ.get('TOWNSEARCHER_LAUNCH_TIME', STARTED))
 
-functions_lib.filter_df.argtypes = [ctypes.POINTER(ctypes.c_char_p), ctypes.POINTER(ctypes.c_char_p), ctypes.POINTER(ctypes.c_char_p), ctypes.c_size_t, ctypes.c_char_p, ctypes.c_char_p, ctypes.POINTER(ctypes.c_int)]
-functions_lib.filter_df.restype = None
-
-functions_lib.calculate_final_distances.argtypes = [ctypes.POINTER(ctypes.c_char_p), ctypes.c_size_t, ctypes.c_char_p, ctypes.POINTER(ctypes.c_size_t)]
-functions_lib.calculate_final_distances.restype = None
 
 class CommunePredictorApp:
     def __init__(self, root):
@@ -31,10 +17,10 @@ class CommunePredictorApp:
             self.root.title("Recherche de Communes avec Prédiction")
             self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         
-        # Charger les données
-        self.df_France = self.load_communes_data('./communes/France.csv')
-        self.df_Allemange = self.load_communes_data('./communes/Allemagne.csv')
-        self.df_Suisse = self.load_communes_data('./communes/Suisse.csv')
+        # Moteur de recherche : importé (numpy, bibliothèque C) et créé par le thread de recherche à
+        # la première requête, la fenêtre s'affiche sans l'attendre. Les pays sont chargés à leur
+        # première sélection.
+        self.engine = None
         
         # Variables for checkboxes
         self.france_var = tk.BooleanVar(value=True)
@@ -44,92 +30,45 @@ class CommunePredictorApp:
         # Variables for pagination
         self.results_per_page = 10
         self.current_page = 0
-        self.results = pd.DataFrame(columns = ['Pays', 'nom_standard', 'dep_code'])
+        self.results = None  # SearchResults, None until the first search is done
+        self.selected_countries = ()
         self.sort_order = True
         
         self.correction_var = tk.BooleanVar()
+
+        # Result rows and letter buttons are created once and reused: a new page only updates their text
+        self.result_rows = []  # (row_frame, pays_label, depcode_label, name_label, distance_label)
+        self.visible_rows = 0
+        self.letter_buttons = []
+        self.next_letters = []
+        # Debug mode (TOWNSEARCHER_DEBUG=1) shows the render time of each page and times every search stage
+        self.debug = bool(os.environ.get('TOWNSEARCHER_DEBUG'))
+        self.startup_times = {}  # Temps de démarrage (s) depuis LAUNCH_TIME, en mode debug
         
-        self.min_distance = 15  # Minimum Levenshtein distance to consider
-        self.max_suggestions = 20  # Maximum number of suggestions to add
-        
-        # Event to cancel ongoing calculations
-        self.cancel_event = threading.Event()
+        # Single search thread: only the latest query runs, cancelling the previous scan
+        self.search_debounce = 0.02  # Seconds to wait for further keystrokes before searching
+        self.scheduler = SearchScheduler(lambda request, cancel: self._update_suggestions_thread(*request, cancel),
+                                         debounce=self.search_debounce)
         
         # Interface graphique
         self.create_widgets()
         
-        # Initialize the combined dataframe
-        self.df = pd.DataFrame(columns=['Pays', 'nom_standard', 'nom_sans_accent', 'nom_standard_majuscule', 'dep_code'])
-        
-        # Combine the dataframes into one if checkboxes are checked
+        if self.debug:
+            self.startup_times['window'] = time.time() - LAUNCH_TIME
+
+        # Select the countries whose checkboxes are checked; their data is loaded in the search thread
         self.update_combined_df()
 
-    
-    def load_communes_data(self, filepath: str) -> pd.DataFrame:
-        # Pays,nom_standard,nom_sans_accent,nom_standard_majuscule,dep_code,nom_standard
-        dtype = {
-            'Pays': str,
-            'nom_standard': str,
-            'nom_sans_accent': str,
-            'nom_standard_majuscule': str,
-            'dep_code': str
-        }
-        
-        df = pd.DataFrame(columns=['Pays', 'nom_standard', 'nom_sans_accent', 'nom_standard_majuscule', 'dep_code'])
-        if os.path.exists(filepath):
-            read = pd.read_csv(filepath, dtype=dtype)
-            df = pd.concat([df, read], ignore_index=True)  # ensure index is reset
-        else:
-            print(f"File not found: {filepath}")
-        return df
-
-    def correction(self, query, min_distance, max_suggestions) -> pd.DataFrame:
-        names = self.df['nom_standard'].values
-        dep_codes = self.df['dep_code'].values
-        pays = self.df['Pays'].values
-        names_count = len(names)
-        
-        # Convert names to ctypes array
-        names_ctypes = (ctypes.c_char_p * names_count)(*map(lambda x: x.encode('utf-8'), names))
-        distances = (ctypes.c_size_t * names_count)()  # Change to store all distances
-        
-        # Call the C function - modify to calculate distances for all names
-        functions_lib.calculate_final_distances(names_ctypes, names_count, query.encode('utf-8'), distances)
-        
-        # Create a list of tuples (distance, pays, name, dep_code)
-        distance_items = [(distances[i], pays[i], names[i], dep_codes[i]) for i in range(names_count)]
-        
-        # Sort by distance and take max_suggestions items with distance < min_distance
-        distance_items.sort(key=lambda x: x[0])
-        filtered_items = [item for item in distance_items if item[0] < min_distance][:max_suggestions]
-        
-        # Collect results
-        results = [(item[1], item[2], item[3]) for item in filtered_items]
-        
-        additional_results_df = pd.DataFrame(results, columns=['Pays', 'nom_standard', 'dep_code'])
-        return additional_results_df[['Pays', 'nom_standard', 'dep_code']]
-
-    def filter_df(self, query, search_type) -> pd.DataFrame:
-        names = self.df['nom_standard'].values
-        names_sans_accent = self.df['nom_sans_accent'].values
-        names_majuscule = self.df['nom_standard_majuscule'].values
-        names_count = len(names)
-        
-        # Convert names to ctypes array
-        
-        names_ctypes = (ctypes.c_char_p * names_count)(*map(lambda x: x.encode('utf-8'), names))
-        names_sans_accent_ctypes = (ctypes.c_char_p * names_count)(*map(lambda x: x.encode('utf-8'), names_sans_accent))
-        names_majuscule_ctypes = (ctypes.c_char_p * names_count)(*map(lambda x: x.encode('utf-8'), names_majuscule))
-        results = (ctypes.c_int * names_count)()
-        
-        # Call the C function
-        functions_lib.filter_df(names_ctypes, names_sans_accent_ctypes, names_majuscule_ctypes, names_count, query.encode('utf-8'), search_type.encode('utf-8'), results)
-        
-        # Collect results
-        filtered_indices = [i for i in range(names_count) if results[i] == 1]
-        filtered_df = self.df.iloc[filtered_indices]
-        
-        return filtered_df
+    def get_engine(self):
+        # Called from the search thread only
+        if self.engine is None:
+            from engine import SearchEngine
+            engine = SearchEngine(min_distance=15, max_suggestions=20)
+            if self.debug:
+                engine.enable_timing()
+            self.engine = engine
+        return self.engine
+
     
     def on_key_release(self):
         current_query = self.entry_var.get().strip()
@@ -159,7 +98,7 @@ class CommunePredictorApp:
         # Search options in options_frame
         self.search_type_var = tk.StringVar(value="Contenant")
         search_type_menu = ttk.OptionMenu(options_frame, self.search_type_var, "Contenant", 
-                                        "Commencant par", "Finissant par", "Contenant", 
+                                        "Commencant par", "Finissant par", "Contenant", "Phonétique",
                                         command=self.update_suggestions)
         search_type_menu.pack(side=tk.LEFT, padx=10)
 
@@ -219,11 +158,11 @@ class CommunePredictorApp:
         row = 4
         self.rowletters = row
         self.letter_buttons_frame = tk.Frame(self.root)
-        self.letter_buttons_frame.grid(row=row, column=0, columnspan=4, pady=5, sticky="ew")
+        self.letter_buttons_frame.grid(row=row, column=0, columnspan=2, pady=5)
 
         # Row 5 - Results count
         row = 5
-        self.results_count_label = tk.Label(self.root, text="Page 0/0 Résultats: 0")
+        self.results_count_label = tk.Label(self.root, text="Chargement des données…")
         self.results_count_label.grid(row=row, column=0, columnspan=2, pady=5, sticky="w")
 
         # Row 6 - Pagination
@@ -250,70 +189,36 @@ class CommunePredictorApp:
         # Set initial focus
         self.entry.focus_set()
     
-    def search_communes(self, query: str, search_type: str) -> pd.DataFrame:
-        filtered_df = self.filter_df(query, search_type)
-        if self.correction_var.get():
-            additional_results_df = self.correction(query, self.min_distance, self.max_suggestions)
-            filtered_df = pd.concat([filtered_df, additional_results_df])
-                
-        return filtered_df[['Pays', 'nom_standard', 'dep_code']]
-
-    def sort_results(self, results: pd.DataFrame) -> pd.DataFrame:
-        sort_type = self.sort_type_var.get()
-        if sort_type == "Distance":
-            return results.sort_values(by='distance', ascending=self.sort_order)
-        elif sort_type == "Nom":
-            results = results.sort_values(by='nom_standard', ascending=self.sort_order)
-        elif sort_type == "Longueur":
-            results = results.assign(length=results['nom_standard'].str.len()).sort_values(by='length', ascending=self.sort_order).drop(columns='length')
-        elif sort_type == "Département":
-            results = results.sort_values(by='dep_code', ascending=self.sort_order)
-        return results
-
     def update_suggestions(self, event=None) -> None:
         query = self.entry_var.get().strip()
         search_type = self.search_type_var.get()
-        self.cancel_event.set()  # Cancel any ongoing calculations
-        self.cancel_event = threading.Event()  # Create a new event for the new thread
-        threading.Thread(target=self._update_suggestions_thread, args=(query, search_type, self.cancel_event)).start()
-
-    def _update_suggestions_thread(self, query: str, search_type: str, cancel_event: threading.Event) -> None:
-        self.results = self.search_communes(query, search_type)
-        if cancel_event.is_set():
+        # The search thread only gets plain values: it never reads the Tk variables
+        self.scheduler.submit((query, search_type, self.selected_countries, self.correction_var.get(),
+                               self.sort_type_var.get(), self.sort_order))  # Cancels any ongoing calculations
+
+    def _update_suggestions_thread(self, query: str, search_type: str, countries: tuple, correction: bool,
+                                   sort_type: str, ascending: bool, cancel=None) -> None:
+        # `cancel` (ctypes.c_int) is set by the scheduler when a newer query arrives
+        engine = self.get_engine()
+        view = engine.view_for(countries)  # Loads the countries not loaded yet
+        results = engine.search(query, search_type, correction=correction,
+                                sort=sort_type, ascending=ascending, cancel=cancel, view=view)
+        if results is None:
             return
-        
-        # Calculate distances for final results
-        names_count = len(self.results)
-        #ic("Initial results :", self.results)
-        if names_count > 0:
-            names = self.results['nom_standard'].values
-            names_ctypes = (ctypes.c_char_p * names_count)(*map(lambda x: x.encode('utf-8'), names))
-            distances = (ctypes.c_size_t * names_count)()
-            
-            functions_lib.calculate_final_distances(names_ctypes, names_count, query.encode('utf-8'), distances)
-            
-            # Add distances to dataframe
-            self.results['distance'] = list(distances)
-        #ic("Updated results after adding distances:", self.results)
-        self.results = self.results.drop_duplicates(subset=['nom_standard'])
-        self.results = self.sort_results(self.results)
+        self.results = results
         self.current_page = 0
         self.root.after(0, self.display_results)
     
     def update_combined_df(self) -> None:
-        selected_dfs = []
+        selected_countries = []
         if self.france_var.get():
-            selected_dfs.append(self.df_France)
+            selected_countries.append('France')
         if self.allemagne_var.get():
-            selected_dfs.append(self.df_Allemange)
+            selected_countries.append('Allemagne')
         if self.suisse_var.get():
-            selected_dfs.append(self.df_Suisse)
-        
-        if selected_dfs:
-            self.df = pd.concat(selected_dfs)
-        else:
-            self.df = pd.DataFrame(columns=['Pays', 'nom_standard', 'nom_sans_accent', 'nom_standard_majuscule', 'dep_code'])
+            selected_countries.append('Suisse')
         
+        self.selected_countries = tuple(selected_countries)
         self.update_suggestions()
     
     def prev_page(self) -> None:
@@ -322,7 +227,7 @@ class CommunePredictorApp:
             self.display_results()
 
     def next_page(self) -> None:
-        if (self.current_page + 1) * self.results_per_page < len(self.results):
+        if self.results is not None and (self.current_page + 1) * self.results_per_page < len(self.results):
             self.current_page += 1
             self.display_results()
 
@@ -345,43 +250,61 @@ class CommunePredictorApp:
         self.update_suggestions()
     
     def display_results(self) -> None:
-        if self.results.empty:
-            self.results_count_label.config(text="Page 0/0 Résultats: 0")
-            for widget in self.suggestions_canvas_frame.winfo_children():
-                widget.destroy()
-            return
-
-        for widget in self.suggestions_canvas_frame.winfo_children():
-            widget.destroy()
-
+        if self.results is None:
+            return  # Data still loading, the first search displays its results
+        start = time.perf_counter()
         start_idx = self.current_page * self.results_per_page
         end_idx = start_idx + self.results_per_page
-        for _, row in self.results.iloc[start_idx:end_idx].iterrows():
-            name = row['nom_standard']
-            depcode = row['dep_code']
-            pays = row['Pays']
-            distance = row['distance'] if 'distance' in row else ''
-            
-            row_frame = tk.Frame(self.suggestions_canvas_frame)
+        page = self.results.page(start_idx, end_idx) if len(self.results) else []
+
+        while len(self.result_rows) < len(page):
+            self.result_rows.append(self.create_result_row())
+        for (_, pays_label, depcode_label, name_label, distance_label), (pays, name, depcode, distance) in zip(self.result_rows, page):
+            pays_label.config(text=pays)
+            depcode_label.config(text=depcode)
+            name_label.config(text=name)
+            distance_label.config(text=f"({distance})")
+        # Only the trailing rows are hidden, so showing them again keeps their order
+        for row_frame, *_ in self.result_rows[self.visible_rows:len(page)]:
             row_frame.pack(fill=tk.X, padx=5, pady=2)
+        for row_frame, *_ in self.result_rows[len(page):self.visible_rows]:
+            row_frame.pack_forget()
+        self.visible_rows = len(page)
 
-            copy_button = tk.Button(row_frame, text="Copier", command=lambda n=name: self.copy_to_clipboard(n))
-            copy_button.pack(side=tk.RIGHT)
-            label = tk.Label(row_frame, text=f"({distance})" if distance != '' else " ", anchor='w', width=5)
-            label.pack(side=tk.RIGHT)
-            label = tk.Label(row_frame, text=" ", anchor='w')
-            label.pack(side=tk.LEFT)
-            label = tk.Label(row_frame, text=pays, anchor='w', width=9)
-            label.pack(side=tk.LEFT)
-            label = tk.Label(row_frame, text=depcode, anchor='w', width=3)
-            label.pack(side=tk.LEFT)
-            label = tk.Label(row_frame, text=name, anchor='w', width=25)
-            label.pack(side=tk.LEFT)
-
-        total_pages = (len(self.results) + self.results_per_page - 1) // self.results_per_page
-        self.results_count_label.config(text=f"Page {self.current_page+1}/{total_pages} Résultats: {len(self.results)}")
-
-        self.update_next_letters(self.entry_var.get().strip())
+        if len(self.results) == 0:
+            count_text = "Page 0/0 Résultats: 0"
+        else:
+            total_pages = (len(self.results) + self.results_per_page - 1) // self.results_per_page
+            count_text = f"Page {self.current_page+1}/{total_pages} Résultats: {len(self.results)}"
+            self.update_next_letters(self.entry_var.get().strip())
+
+        if self.debug:
+            self.root.update_idletasks()  # Include the layout in the measure
+            render_time = (time.perf_counter() - start) * 1000
+            self.engine.timer.add('render', render_time / 1000)
+            from icecream import ic
+            if 'first_results' not in self.startup_times:
+                self.startup_times['first_results'] = time.time() - LAUNCH_TIME
+                ic(self.startup_times)
+            ic(render_time, len(page))
+            count_text += f" (rendu: {render_time:.1f} ms)"
+        self.results_count_label.config(text=count_text)
+
+    def create_result_row(self) -> tuple:
+        row_frame = tk.Frame(self.suggestions_canvas_frame)
+        name_label = tk.Label(row_frame, text="", anchor='w', width=25)
+        copy_button = tk.Button(row_frame, text="Copier", command=lambda: self.copy_to_clipboard(name_label.cget('text')))
+        copy_button.pack(side=tk.RIGHT)
+        distance_label = tk.Label(row_frame, text=" ", anchor='w', width=5)
+        distance_label.pack(side=tk.RIGHT)
+        label = tk.Label(row_frame, text=" ", anchor='w')
+        label.pack(side=tk.LEFT)
+        pays_label = tk.Label(row_frame, text="", anchor='w', width=9)
+        pays_label.pack(side=tk.LEFT)
+        depcode_label = tk.Label(row_frame, text="", anchor='w', width=3)
+        depcode_label.pack(side=tk.LEFT)
+        name_label.pack(side=tk.LEFT)
+        return row_frame, pays_label, depcode_label, name_label, distance_label
 
     def copy_to_clipboard(self, text: str) -> None:
         self.root.clipboard_clear()
@@ -389,23 +312,19 @@ class CommunePredictorApp:
         self.root.update()
 
     def update_next_letters(self, query: str) -> None:
-        self.letter_buttons_frame.destroy()
-        self.letter_buttons_frame = tk.Frame(self.root)
-        self.letter_buttons_frame.grid(row=self.rowletters, column=0, columnspan=2, pady=5)
-
-        if not query:
+        letters = self.engine.next_letters(query, self.results.view) if query else []
+        if letters == self.next_letters:
             return
-
-        # Extraire les prochaines lettres possibles
-        possible_letters = set()
-        for name in self.df['nom_standard'].dropna():
-            if name.lower().startswith(query.lower()):
-                if len(name) > len(query):
-                    possible_letters.add(name[len(query)].lower())
-
-        # Créer des boutons pour chaque lettre possible
-        for letter in sorted(possible_letters):
-            button = tk.Button(self.letter_buttons_frame, text=letter.upper(), command=lambda l=letter: self.append_letter(l))
+        self.next_letters = letters
+
+        # Un bouton par lettre possible, les boutons en trop sont masqués
+        while len(self.letter_buttons) < len(letters):
+            index = len(self.letter_buttons)
+            self.letter_buttons.append(tk.Button(self.letter_buttons_frame, command=lambda i=index: self.append_letter(self.next_letters[i])))
+        for button in self.letter_buttons:
+            button.pack_forget()
+        for button, letter in zip(self.letter_buttons, letters):
+            button.config(text=letter.upper())
             button.pack(side=tk.LEFT, padx=2)
 
     def append_letter(self, letter: str) -> None:
@@ -415,7 +334,10 @@ class CommunePredictorApp:
         self.update_suggestions()
     
     def on_closing(self):
-        self.cancel_event.set()
+        if self.debug and self.engine is not None:
+            from icecream import ic
+            ic(self.engine.timing_stats(), self.scheduler.stats())
+        self.scheduler.close()
         self.root.destroy()
 
 
@@ -0,0 +1,46 @@
+import ctypes
+import os
+import platform
+from pathlib import Path
+
+
+# Load the shared library into ctypes (built by launch.py in <repo>/shared)
+SHARED_DIR = Path(__file__).resolve().parent.parent / 'shared'
+if platform.system() == "Windows":
+    functions_lib = ctypes.CDLL(str(SHARED_DIR / 'functions.dll'))
+else:  # Unix-like systems
+    functions_lib = ctypes.CDLL(str(SHARED_DIR / 'functions.so'))
+
+# Define the argument and return types for the C functions
+# Name columns are passed as an (arena, offsets) pointer pair, see store.NameColumn; the scans
+# take the folded names and query as uint32 codepoints, see store.CodepointColumn
+size_t_p = ctypes.POINTER(ctypes.c_size_t)
+# Scans also take an optional cancellation flag (a ctypes.c_int set to 1 to stop them), or None
+cancel_p = ctypes.POINTER(ctypes.c_int)
+
+functions_lib.calculate_nearest.argtypes = [ctypes.c_void_p, size_t_p, size_t_p, ctypes.c_size_t, ctypes.c_void_p, ctypes.c_size_t, ctypes.c_size_t, ctypes.c_size_t, size_t_p, size_t_p, cancel_p]
+functions_lib.calculate_nearest.restype = ctypes.c_size_t
+
+functions_lib.calculate_nearest_batch.argtypes = [ctypes.c_void_p, size_t_p, ctypes.c_size_t, ctypes.c_void_p, size_t_p, ctypes.c_size_t, ctypes.c_size_t, ctypes.c_size_t, size_t_p, size_t_p, size_t_p, cancel_p]
+functions_lib.calculate_nearest_batch.restype = None
+
+functions_lib.filter_df.argtypes = [ctypes.c_void_p, size_t_p, size_t_p, ctypes.c_size_t, ctypes.c_void_p, ctypes.c_size_t, ctypes.c_char_p, size_t_p, cancel_p]
+functions_lib.filter_df.restype = ctypes.c_size_t
+
+functions_lib.calculate_final_distances.argtypes = [ctypes.c_void_p, size_t_p, size_t_p, ctypes.c_size_t, ctypes.c_void_p, ctypes.c_size_t, size_t_p, cancel_p]
+functions_lib.calculate_final_distances.restype = None
+
+functions_lib.prefix_range.argtypes = [ctypes.c_void_p, size_t_p, size_t_p, ctypes.c_size_t, ctypes.c_char_p, ctypes.c_size_t, size_t_p, size_t_p]
+functions_lib.prefix_range.restype = None
+
+functions_lib.next_letters.argtypes = [ctypes.c_void_p, size_t_p, size_t_p, ctypes.c_size_t, ctypes.c_char_p, ctypes.c_size_t, ctypes.c_char_p, ctypes.c_size_t]
+functions_lib.next_letters.restype = ctypes.c_size_t
+
+functions_lib.set_thread_count.argtypes = [ctypes.c_size_t]
+functions_lib.set_thread_count.restype = None
+
+functions_lib.get_thread_count.argtypes = []
+functions_lib.get_thread_count.restype = ctypes.c_size_t
+
+# Worker threads used by the C scans (TOWNSEARCHER_THREADS overrides the number of cores)
+functions_lib.set_thread_count(int(os.environ.get('TOWNSEARCHER_THREADS', os.cpu_count() or 1)))
@@ -0,0 +1,115 @@
+import re
+from functools import lru_cache
+
+# Clés phonétiques des noms, calculées sur leur forme repliée (voir store.fold : minuscules sans
+# accents, séparateurs unifiés en '-') : deux noms qui se prononcent de la même façon ont la
+# même clé. Les précisions entre parenthèses ("Strasburg (Uckermark)") sont ignorées.
+# Les clés sont mises en cache avec les pays : modifier une règle impose d'incrémenter store.CACHE_VERSION.
+
+QUALIFIER = re.compile(r'\(.*?\)')
+NOT_LETTER = re.compile(r'[^a-z]+')
+
+
+def words(folded: str) -> list:
+    return [word for word in NOT_LETTER.split(QUALIFIER.sub('', folded)) if word]
+
+
+# Règles françaises, appliquées dans l'ordre à chaque mot ; les phonèmes sans lettre propre sont
+# notés en majuscules (A = an/en, O = on, I = in/un, U = ou, S = ch, W = oi, E = ai/ei/-er)
+FRENCH_RULES = [(re.compile(pattern), replacement) for pattern, replacement in (
+    (r'y', 'i'),
+    (r'([ae])ill?e?', r'\1i'),
+    (r'(.)\1+', r'\1'),  # Lettres doubles
+    (r'eaux?', 'o'),
+    (r'aux?$', 'o'),
+    (r'au', 'o'),
+    (r'oin', 'WI'),
+    (r'oi', 'W'),
+    (r'ou', 'U'),
+    (r'ph', 'f'),
+    (r'gn', 'ni'),
+    (r'sch|ch|sh', 'S'),
+    (r'qu?', 'k'),
+    (r'gu(?=[eiy])', 'g'),
+    (r'c(?=[eiy])', 's'),
+    (r'ck|c', 'k'),
+    (r'g(?=[eiy])', 'j'),
+    (r'th', 't'),
+    (r'h', ''),
+    (r'[ae]in(?![aeiouy])', 'I'),
+    (r'[iuy][nm](?![aeiouy])', 'I'),
+    (r'[ae][nm](?![aeiouy])', 'A'),
+    (r'o[nm](?![aeiouy])', 'O'),
+    (r'ai|ei|e[rtz]$', 'E'),
+    (r'x$', ''),
+    (r'x', 'ks'),
+    (r'w', 'v'),
+    (r'z', 's'),
+    (r'(.)\1+', r'\1'),
+    # Fin de mot : -s et -es, puis e muet, sont retirés avant les consonnes finales muettes, pour
+    # que "Nantes" et "Nant" ou "Angers" et "Anger" aient la même clé
+    (r'(?<=.)e?s$', ''),
+    (r'(?<=.)e[rtz]$', 'E'),
+    (r'(?<=.)e$', ''),
+    (r'(?<=.)[stdp]$', ''),  # Consonnes finales muettes
+)]
+
+# Lettres dont la prononciation est perdue par store.fold (ç -> c) : remplacées avant le repliement.
+# Les noms sont indexés sous les deux clés, une requête tapée sans cédille les trouve aussi.
+PHONETIC_TABLE = str.maketrans({'ç': 's', 'Ç': 's'})
+
+
+@lru_cache(maxsize=65536)
+def french_word_key(word: str) -> str:
+    # Mémorisé : "saint", "sur", "le"... reviennent des milliers de fois à la construction d'un pays
+    for pattern, replacement in FRENCH_RULES:
+        word = pattern.sub(replacement, word)
+    return word
+
+
+def french_key(folded: str) -> str:
+    return ''.join(map(french_word_key, words(folded)))
+
+
+# Kölner Phonetik (Postel, 1969) : chaque lettre devient un chiffre selon son contexte
+COLOGNE_CODES = {
+    **dict.fromkeys('aeijouy', '0'), 'h': '', 'b': '1', **dict.fromkeys('fvw', '3'),
+    **dict.fromkeys('gkq', '4'), 'l': '5', 'm': '6', 'n': '6', 'r': '7', 's': '8', 'z': '8',
+}
+
+
+def cologne_key(folded: str) -> str:
+    letters = ''.join(words(folded))
+    digits = []
+    for i, letter in enumerate(letters):
+        previous = letters[i - 1] if i > 0 else ''
+        following = letters[i + 1] if i + 1 < len(letters) else ''
+        if letter == 'p':
+            code = '3' if following == 'h' else '1'
+        elif letter in 'dt':
+            code = '8' if following in ('c', 's', 'z') else '2'
+        elif letter == 'c':
+            if i == 0:
+                code = '4' if following in ('a', 'h', 'k', 'l', 'o', 'q', 'r', 'u', 'x') else '8'
+            else:
+                code = '4' if following in ('a', 'h', 'k', 'o', 'q', 'u', 'x') and previous not in ('s', 'z') else '8'
+        elif letter == 'x':
+            code = '8' if previous in ('c', 'k', 'q') else '48'
+        else:
+            code = COLOGNE_CODES.get(letter, '')
+        digits.append(code)
+
+    # Chiffres consécutifs identiques regroupés, puis les 0 supprimés sauf en tête
+    key = ''
+    for digit in ''.join(digits):
+        if not key or key[-1] != digit:
+            key += digit
+    return key[:1] + key[1:].replace('0', '')
+
+
+# Schéma phonétique de chaque pays (français par défaut)
+PHONETIC_KEYS = {'Allemagne': cologne_key}
+
+
+def phonetic_key(country: str, folded: str) -> str:
+    return PHONETIC_KEYS.get(country, french_key)(folded)
@@ -0,0 +1,85 @@
+import ctypes
+import threading
+import time
+import traceback
+
+
+class SearchScheduler:
+    # Un seul thread de recherche, créé une fois : seule la dernière requête soumise est exécutée,
+    # et une nouvelle requête interrompt la recherche en cours via son drapeau d'annulation,
+    # vérifié dans les boucles C.
+    def __init__(self, search, debounce: float = 0.0):
+        self.search = search  # search(request, cancel), cancel étant un ctypes.c_int
+        self.debounce = debounce  # Attente (s) avant de lancer une recherche, pour regrouper les frappes
+        self.condition = threading.Condition()
+        self.pending = None
+        self.running_cancel = None
+        self.closed = False
+        self.counters = {
+            'threads_started': 0,
+            'requests_submitted': 0,
+            'requests_coalesced': 0,  # remplacées par une requête plus récente avant d'être lancées
+            'scans_completed': 0,
+            'scans_aborted': 0,
+            'scans_failed': 0,  # recherches terminées par une exception (affichée sur stderr)
+            'wasted_cpu_time': 0.0,  # temps CPU (s) des recherches interrompues
+        }
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.counters['threads_started'] += 1
+
+    def submit(self, request) -> None:
+        with self.condition:
+            self.counters['requests_submitted'] += 1
+            if self.pending is not None:
+                self.counters['requests_coalesced'] += 1
+            self.pending = request
+            if self.running_cancel is not None:
+                self.running_cancel.value = 1
+            self.condition.notify()
+
+    def close(self) -> None:
+        with self.condition:
+            self.closed = True
+            self.pending = None
+            if self.running_cancel is not None:
+                self.running_cancel.value = 1
+            self.condition.notify()
+
+    def stats(self) -> dict:
+        with self.condition:
+            return dict(self.counters)
+
+    def run(self) -> None:
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+            if self.debounce:
+                time.sleep(self.debounce)
+            with self.condition:
+                if self.closed:
+                    return
+                request, self.pending = self.pending, None
+                cancel = self.running_cancel = ctypes.c_int(0)
+
+            # Le temps CPU du processus inclut les threads C de la recherche
+            start = time.process_time()
+            failed = False
+            try:
+                self.search(request, cancel)
+            except Exception:
+                # Une recherche en échec ne doit pas arrêter le thread : les suivantes sont traitées
+                traceback.print_exc()
+                failed = True
+            with self.condition:
+                self.running_cancel = None
+                if failed:
+                    self.counters['scans_failed'] += 1
+                elif cancel.value:
+                    self.counters['scans_aborted'] += 1
+                    self.counters['wasted_cpu_time'] += time.process_time() - start
+                else:
+                    self.counters['scans_completed'] += 1
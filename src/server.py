@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# Service HTTP/JSON local pour l'autocomplétion depuis des formulaires web :
+#   python src/server.py --port 8765
+#   GET /search?q=Stras&mode=Commencant+par&correction=1&sort=Nom&ascending=1&countries=France,Suisse&limit=20
+#   GET /next_letters?q=Stras&countries=France
+#   GET /stats
+# Les recherches (boucles C) tournent dans un pool de threads. Des requêtes identiques en cours
+# partagent une seule recherche, annulée quand tous les clients qui l'attendent se sont déconnectés.
+import argparse
+import asyncio
+import ctypes
+import ipaddress
+import json
+import os
+import sys
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from engine import SEARCH_TYPES, SORT_TYPES, SearchEngine
+
+MAX_REQUEST_SIZE = 16384
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class InFlight:
+    # Recherche en cours partagée par les requêtes identiques
+    def __init__(self, future: asyncio.Future, cancel: ctypes.c_int):
+        self.future = future
+        self.cancel = cancel
+        self.waiters = 0
+
+
+class SearchServer:
+    def __init__(self, engine: SearchEngine, threads: int = None, latency_window: int = 10000):
+        self.engine = engine
+        self.executor = ThreadPoolExecutor(max_workers=threads or os.cpu_count() or 1, thread_name_prefix='search')
+        self.in_flight = {}
+        self.latencies = {'search': deque(maxlen=latency_window), 'next_letters': deque(maxlen=latency_window)}
+        self.counters = {
+            'requests': 0,
+            'errors': 0,
+            'scans_started': 0,
+            'scans_shared': 0,  # requêtes servies par une recherche déjà en cours
+            'scans_cancelled': 0,
+            'disconnected': 0,
+        }
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        start = time.perf_counter()
+        try:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                return
+            self.counters['requests'] += 1
+            try:
+                endpoint, params = self.parse_request(head)
+                if endpoint == 'stats':
+                    body = self.stats()
+                else:
+                    body = await self.until_disconnected(reader, self.dispatch(endpoint, params))
+                    if body is None:
+                        self.counters['disconnected'] += 1
+                        return
+                    self.latencies[endpoint].append(time.perf_counter() - start)
+                status = 200
+            except HTTPError as error:
+                self.counters['errors'] += 1
+                status, body = error.status, {'error': str(error)}
+            except Exception as error:
+                # Erreur inattendue (recherche, chargement d'un pays...) : le client reçoit quand même une réponse
+                traceback.print_exc()
+                self.counters['errors'] += 1
+                status, body = 500, {'error': f"internal error: {type(error).__name__}"}
+            await self.respond(writer, status, body)
+        finally:
+            writer.close()
+
+    def parse_request(self, head: bytes) -> tuple:
+        try:
+            method, target, _ = head.split(b'\r\n', 1)[0].decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise HTTPError(400, "malformed request line")
+        if method != 'GET':
+            raise HTTPError(405, f"unsupported method {method}")
+        url = urlsplit(target)
+        endpoint = url.path.strip('/')
+        if endpoint not in ('search', 'next_letters', 'stats'):
+            raise HTTPError(404, f"unknown endpoint {url.path}")
+        params = {key: values[-1] for key, values in parse_qs(url.query, keep_blank_values=True).items()}
+        return endpoint, params
+
+    def countries(self, params: dict) -> tuple:
+        countries = tuple(country for country in params.get('countries', 'France').split(',') if country)
+        unknown = [country for country in countries if country not in self.engine.countries]
+        if unknown:
+            raise HTTPError(400, f"unknown countries {unknown}")
+        return countries
+
+    async def dispatch(self, endpoint: str, params: dict):
+        query = params.get('q', '').strip()
+        countries = self.countries(params)
+        if endpoint == 'next_letters':
+            letters = await self.run(('next_letters', query, countries),
+                                     lambda cancel: self.engine.next_letters(query, self.engine.view_for(countries)))
+            return {'query': query, 'letters': letters}
+
+        mode = params.get('mode', 'Contenant')
+        if mode not in SEARCH_TYPES:
+            raise HTTPError(400, f"unknown mode {mode}")
+        correction = params.get('correction', '0') in ('1', 'true')
+        sort = params.get('sort', 'Nom')
+        if sort not in SORT_TYPES:
+            raise HTTPError(400, f"unknown sort {sort}")
+        ascending = params.get('ascending', '1') in ('1', 'true')
+        try:
+            limit = int(params.get('limit', 20))
+        except ValueError:
+            raise HTTPError(400, "limit must be an integer")
+        if limit < 0:
+            raise HTTPError(400, "limit must not be negative")
+        # La limite ne change que la page renvoyée : elle ne fait pas partie de la clé partagée
+        results = await self.run(('search', query, mode, correction, sort, ascending, countries),
+                                 lambda cancel: self.engine.search(query, mode, correction, sort, ascending,
+                                                                   cancel=cancel, view=self.engine.view_for(countries)))
+        return {
+            'query': query,
+            'total': len(results),
+            'results': [{'Pays': pays, 'nom_standard': name, 'dep_code': dep_code, 'distance': distance}
+                        for pays, name, dep_code, distance in results.page(0, limit)],
+        }
+
+    async def run(self, key: tuple, search):
+        # Lance `search(cancel)` dans le pool, ou attend la recherche identique déjà en cours
+        entry = self.in_flight.get(key)
+        if entry is None:
+            cancel = ctypes.c_int(0)
+            future = asyncio.get_running_loop().run_in_executor(self.executor, search, cancel)
+            entry = self.in_flight[key] = InFlight(future, cancel)
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None) if self.in_flight.get(key) is entry else None)
+            self.counters['scans_started'] += 1
+        else:
+            self.counters['scans_shared'] += 1
+        entry.waiters += 1
+        try:
+            return await asyncio.shield(entry.future)
+        except asyncio.CancelledError:
+            # Plus personne n'attend ce résultat : on interrompt les boucles C
+            entry.waiters -= 1
+            if entry.waiters == 0 and not entry.future.done():
+                entry.cancel.value = 1
+                self.in_flight.pop(key, None)
+                self.counters['scans_cancelled'] += 1
+            raise
+
+    @staticmethod
+    async def until_disconnected(reader: asyncio.StreamReader, coroutine):
+        # Résultat de `coroutine`, ou None si le client ferme la connexion avant
+        task = asyncio.ensure_future(coroutine)
+        disconnect = asyncio.ensure_future(reader.read(1))
+        try:
+            done, _ = await asyncio.wait((task, disconnect), return_when=asyncio.FIRST_COMPLETED)
+            if task in done:
+                return task.result()
+            if disconnect.result():
+                return await task  # Données en trop après la requête : pas une déconnexion
+            task.cancel()
+            return None
+        finally:
+            disconnect.cancel()
+
+    @staticmethod
+    async def respond(writer: asyncio.StreamWriter, status: int, body: dict) -> None:
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                "Access-Control-Allow-Origin: *\r\n"
+                "Connection: close\r\n\r\n")
+        try:
+            writer.write(head.encode('latin-1') + payload)
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    def stats(self) -> dict:
+        latencies = {}
+        for endpoint, values in self.latencies.items():
+            values = np.array(values) * 1000
+            latencies[endpoint] = {
+                'count': len(values),
+                'p50_ms': round(float(np.percentile(values, 50)), 3) if len(values) else None,
+                'p99_ms': round(float(np.percentile(values, 99)), 3) if len(values) else None,
+            }
+        stats = {'latency': latencies, **self.counters}
+        if self.engine.timer:
+            stats['stages'] = self.engine.timing_stats()
+        return stats
+
+    def close(self) -> None:
+        for entry in self.in_flight.values():
+            entry.cancel.value = 1
+        self.executor.shutdown(wait=True)
+
+
+async def serve(server: SearchServer, host: str, port: int, ready=None) -> None:
+    tcp_server = await asyncio.start_server(server.handle, host, port, limit=MAX_REQUEST_SIZE)
+    if ready is not None:
+        ready(tcp_server)
+    async with tcp_server:
+        await tcp_server.serve_forever()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Service local de recherche de communes (HTTP/JSON).")
+    parser.add_argument('--host', default='127.0.0.1', help="Adresse d'écoute, obligatoirement locale")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--threads', type=int, default=None, help="Threads de recherche")
+    parser.add_argument('--preload', nargs='*', default=['France'], help="Pays chargés au démarrage")
+    parser.add_argument('--timing', action='store_true', help="Temps par étape des recherches dans /stats")
+    args = parser.parse_args(argv)
+
+    try:
+        loopback = args.host == 'localhost' or ipaddress.ip_address(args.host).is_loopback
+    except ValueError:
+        loopback = False
+    if not loopback:
+        parser.error("the service only listens on the loopback interface")
+
+    engine = SearchEngine()
+    if args.timing:
+        engine.enable_timing()
+    for country in args.preload:
+        engine.load(country)
+    server = SearchServer(engine, args.threads)
+    print(f"Listening on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        print(json.dumps(server.stats(), indent=2), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
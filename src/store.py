@@ -0,0 +1,599 @@
+import ctypes
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import unicodedata
+from pathlib import Path
+import numpy as np
+
+from native import functions_lib, size_t_p
+from phonetic import PHONETIC_TABLE, phonetic_key
+
+# Bump when the cached arrays change, so that old caches are rebuilt
+CACHE_VERSION = 6
+CACHE_DIR = str(Path(__file__).resolve().parent.parent / 'cache')
+
+
+# Tirets, espaces et apostrophes sont confondus, comme dans nom_sans_accent ("Plœuc-L'Hermitage" -> "ploeuc-l-hermitage")
+FOLD_TABLE = str.maketrans({**{char: '-' for char in " \u2010\u2011\u2012\u2013\u2014\u2212'`\u00b4\u2018\u2019\u02bc"},
+                            'œ': 'oe', 'æ': 'ae'})
+
+
+def fold(text: str) -> str:
+    # Forme de comparaison d'un nom ou d'une requête : sans accents, casse repliée, séparateurs unifiés
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold().translate(FOLD_TABLE)
+
+
+# Caractères pour lesquels phonetic_fold diffère de fold (ç, précomposé ou c + cédille combinante)
+PHONETIC_CHARS = frozenset(chr(char) for char in PHONETIC_TABLE) | {'\u0327'}
+
+
+def phonetic_fold(text: str) -> str:
+    # fold, après les remplacements qui gardent la prononciation (voir phonetic.PHONETIC_TABLE)
+    return fold(unicodedata.normalize('NFC', text).translate(PHONETIC_TABLE))
+
+
+def codepoints(text: str) -> np.ndarray:
+    # Points de code (uint32) d'une chaîne déjà repliée, pour les fonctions C
+    return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+
+
+def small_int_type(max_value: int) -> np.dtype:
+    # Plus petit entier non signé pouvant contenir max_value
+    return np.min_scalar_type(max(max_value, 0))
+
+
+def unique_sorted(values: np.ndarray) -> np.ndarray:
+    # np.unique pour un tableau déjà trié (np.unique passe par une table de hachage, bien plus lente ici)
+    if len(values) == 0:
+        return values
+    return values[np.append(True, values[1:] != values[:-1])]
+
+
+class NameColumn:
+    # Une colonne de noms : toutes les chaînes UTF-8 (terminées par \0) bout à bout
+    # dans une seule arène, et offsets[i] l'indice du début de la chaîne i.
+    # offsets a names_count + 1 entrées, la longueur de la chaîne i est donc
+    # offsets[i + 1] - offsets[i] - 1.
+    def __init__(self, arena: np.ndarray, offsets: np.ndarray):
+        self.arena = arena
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, values) -> "NameColumn":
+        return cls.from_bytes([value.encode('utf-8') for value in values])
+
+    @classmethod
+    def from_bytes(cls, values) -> "NameColumn":
+        encoded = [value + b'\0' for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uintp)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.uintp, count=len(encoded)), out=offsets[1:])
+        arena = np.frombuffer(b''.join(encoded) or b'\0', dtype=np.uint8)
+        return cls(arena, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def values(self) -> list:
+        return self.arena[:int(self.offsets[-1])].tobytes().split(b'\0')[:-1]
+
+    def take(self, rows: np.ndarray) -> list:
+        # Chaînes des lignes `rows`, décodées
+        arena = self.arena.data
+        starts = self.offsets[rows].tolist()
+        ends = self.offsets[np.asarray(rows) + 1].tolist()
+        return [bytes(arena[start:end - 1]).decode('utf-8') for start, end in zip(starts, ends)]
+
+    def arrays(self, name: str) -> dict:
+        return {f'{name}.arena': self.arena, f'{name}.offsets': self.offsets}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict, name: str) -> "NameColumn":
+        return cls(arrays[f'{name}.arena'], arrays[f'{name}.offsets'])
+
+    def reversed(self) -> "NameColumn":
+        # Noms écrits à l'envers (octet par octet) : un suffixe devient un préfixe
+        return NameColumn.from_bytes([value[::-1] for value in self.values()])
+
+    # Pointeurs passés aux fonctions C (le tableau reste vivant tant que la colonne l'est)
+    @property
+    def arena_ptr(self) -> int:
+        return self.arena.ctypes.data
+
+    @property
+    def offsets_ptr(self):
+        return self.offsets.ctypes.data_as(ctypes.POINTER(ctypes.c_size_t))
+
+
+class CodepointColumn(NameColumn):
+    # Même disposition, mais en points de code de largeur fixe (uint32, terminés par 0) :
+    # les offsets comptent des caractères, et les distances calculées en C aussi
+    @classmethod
+    def from_strings(cls, values) -> "CodepointColumn":
+        values = list(values)
+        offsets = np.zeros(len(values) + 1, dtype=np.uintp)
+        np.cumsum(np.fromiter((len(value) + 1 for value in values), dtype=np.uintp, count=len(values)), out=offsets[1:])
+        arena = codepoints(''.join(value + '\0' for value in values) or '\0')
+        return cls(arena, offsets)
+
+    def values(self) -> list:
+        return self.arena[:int(self.offsets[-1])].tobytes().decode('utf-32-le').split('\0')[:-1]
+
+
+class CodedColumn:
+    # Colonne à peu de valeurs distinctes (Pays, dep_code) : chaque ligne n'est qu'un petit code
+    # entier, indice de sa valeur dans `values` (valeurs distinctes triées, le code est donc aussi
+    # un rang de tri)
+    def __init__(self, codes: np.ndarray, values: NameColumn):
+        self.codes = codes
+        self.values = values
+
+    @classmethod
+    def from_strings(cls, strings) -> "CodedColumn":
+        import pandas as pd
+        codes, values = pd.factorize(pd.Series(strings, dtype=object), sort=True)
+        return cls(codes.astype(small_int_type(len(values) - 1)), NameColumn.from_strings(values))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def distinct(self) -> list:
+        return [value.decode('utf-8') for value in self.values.values()]
+
+    def take(self, rows: np.ndarray) -> list:
+        distinct = self.distinct()
+        return [distinct[code] for code in self.codes[rows].tolist()]
+
+    def arrays(self, name: str) -> dict:
+        return {f'{name}.codes': self.codes, **self.values.arrays(f'{name}.values')}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict, name: str) -> "CodedColumn":
+        return cls(arrays[f'{name}.codes'], NameColumn.from_arrays(arrays, f'{name}.values'))
+
+
+class SortedNames:
+    # Lignes d'une colonne triées par nom (ordre des octets) : les noms commençant par un
+    # préfixe forment un intervalle de `order`, trouvé par dichotomie en C.
+    def __init__(self, column: NameColumn, order: np.ndarray = None):
+        self.column = column
+        if order is None:
+            values = column.values()
+            order = np.array(sorted(range(len(values)), key=values.__getitem__), dtype=np.uintp)
+        self.order = order
+
+    def arrays(self, name: str) -> dict:
+        return {**self.column.arrays(name), f'{name}.order': self.order}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict, name: str, column: NameColumn = None) -> "SortedNames":
+        return cls(column or NameColumn.from_arrays(arrays, name), arrays[f'{name}.order'])
+
+    def prefix_range(self, prefix: bytes) -> tuple:
+        first, last = ctypes.c_size_t(), ctypes.c_size_t()
+        functions_lib.prefix_range(self.column.arena_ptr, self.column.offsets_ptr,
+                                   self.order.ctypes.data_as(size_t_p), len(self.order),
+                                   prefix, len(prefix), ctypes.byref(first), ctypes.byref(last))
+        return first.value, last.value
+
+    def starting_with(self, prefix: bytes) -> np.ndarray:
+        first, last = self.prefix_range(prefix)
+        return self.order[first:last]
+
+    def next_letters(self, prefix: bytes) -> str:
+        # Caractères distincts qui suivent `prefix`, dans l'ordre
+        letters = ctypes.create_string_buffer(1024)
+        letters_len = functions_lib.next_letters(self.column.arena_ptr, self.column.offsets_ptr,
+                                                 self.order.ctypes.data_as(size_t_p), len(self.order),
+                                                 prefix, len(prefix), letters, len(letters))
+        return letters.raw[:letters_len].decode('utf-8', errors='ignore')
+
+
+class TrigramIndex:
+    # Index inversé des trigrammes (3 octets consécutifs) des noms repliés (UTF-8).
+    # Les lignes contenant le trigramme keys[k] sont rows[starts[k]:starts[k + 1]], triées
+    # (sur 32 bits pour réduire le cache, les candidats sont convertis en size_t pour le C).
+    def __init__(self, keys: np.ndarray, starts: np.ndarray, rows: np.ndarray):
+        self.keys = keys
+        self.starts = starts
+        self.rows = rows
+
+    @classmethod
+    def build(cls, columns) -> "TrigramIndex":
+        packed = [np.empty(0, dtype=np.uint64)]
+        for column in columns:
+            end = int(column.offsets[-1])
+            arena = column.arena[:end].astype(np.uint64)
+            row_of_byte = np.repeat(np.arange(len(column), dtype=np.uint64), np.diff(column.offsets).astype(np.int64))
+            # Un trigramme ne doit pas chevaucher le \0 qui sépare deux noms
+            positions = np.flatnonzero((arena[:-2] != 0) & (arena[1:-1] != 0) & (arena[2:] != 0))
+            keys = (arena[positions] << 16) | (arena[positions + 1] << 8) | arena[positions + 2]
+            packed.append((keys << 32) | row_of_byte[positions])
+        # Une seule entrée par (trigramme, ligne), triée par trigramme puis par ligne
+        packed = unique_sorted(np.sort(np.concatenate(packed)))
+        keys = packed >> 32
+        starts = np.flatnonzero(np.append(True, keys[1:] != keys[:-1])) if len(keys) else np.empty(0, dtype=np.intp)
+        return cls(keys[starts].astype(np.uint32), np.append(starts, len(packed)).astype(np.intp), (packed & 0xFFFFFFFF).astype(np.uint32))
+
+    def arrays(self, name: str) -> dict:
+        return {f'{name}.keys': self.keys, f'{name}.starts': self.starts, f'{name}.rows': self.rows}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict, name: str) -> "TrigramIndex":
+        return cls(arrays[f'{name}.keys'], arrays[f'{name}.starts'], arrays[f'{name}.rows'])
+
+    @staticmethod
+    def trigrams(query: bytes) -> set:
+        return {(query[i] << 16) | (query[i + 1] << 8) | query[i + 2] for i in range(len(query) - 2)}
+
+    def candidates(self, query: bytes) -> np.ndarray:
+        # Lignes contenant tous les trigrammes de `query` (sur-ensemble des résultats, à vérifier).
+        # Retourne None si la requête est trop courte pour avoir un trigramme.
+        trigrams = self.trigrams(query)
+        if not trigrams:
+            return None
+        postings = []
+        for key in trigrams:
+            k = np.searchsorted(self.keys, key)
+            if k == len(self.keys) or self.keys[k] != key:
+                return np.empty(0, dtype=np.uintp)
+            postings.append(self.rows[self.starts[k]:self.starts[k + 1]])
+        # Intersection en partant de la liste la plus courte
+        postings.sort(key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            if len(candidates) == 0:
+                break
+            positions = np.searchsorted(posting, candidates)
+            positions[positions == len(posting)] = 0
+            candidates = candidates[posting[positions] == candidates]
+        return np.ascontiguousarray(candidates, dtype=np.uintp)
+
+
+class PhoneticIndex:
+    # Table de hachage des clés phonétiques (voir phonetic) dans des tableaux numpy, à adressage
+    # ouvert et sondage linéaire : l'emplacement d'une clé part de son hachage (FNV-1a 64 bits,
+    # 0 marquant un emplacement vide) et ses lignes sont rows[starts[slot]:starts[slot] + counts[slot]]
+    def __init__(self, hashes: np.ndarray, starts: np.ndarray, counts: np.ndarray, rows: np.ndarray):
+        self.hashes = hashes
+        self.starts = starts
+        self.counts = counts
+        self.rows = rows
+
+    @staticmethod
+    def hash(key: str) -> int:
+        value = 0xcbf29ce484222325
+        for byte in key.encode('utf-8'):
+            value = ((value ^ byte) * 0x100000001b3) & 0xFFFFFFFFFFFFFFFF
+        return value or 1
+
+    @classmethod
+    def build(cls, keys: list) -> "PhoneticIndex":
+        # `keys` : les clés de chaque ligne (une ou deux par ligne, voir phonetic_keys)
+        groups = {}
+        for row, row_keys in enumerate(keys):
+            for key in dict.fromkeys(row_keys):
+                if key:
+                    groups.setdefault(key, []).append(row)
+        size = 1
+        while size < 2 * len(groups):
+            size *= 2
+        hashes = np.zeros(size, dtype=np.uint64)
+        starts = np.zeros(size, dtype=np.uint32)
+        counts = np.zeros(size, dtype=np.uint32)
+        rows, start = [], 0
+        for key, key_rows in groups.items():
+            slot = cls.hash(key) & (size - 1)
+            while hashes[slot]:
+                slot = (slot + 1) & (size - 1)
+            hashes[slot], starts[slot], counts[slot] = cls.hash(key), start, len(key_rows)
+            rows.extend(key_rows)
+            start += len(key_rows)
+        return cls(hashes, starts, counts, np.array(rows, dtype=np.uint32))
+
+    def arrays(self, name: str) -> dict:
+        return {f'{name}.hashes': self.hashes, f'{name}.starts': self.starts, f'{name}.counts': self.counts, f'{name}.rows': self.rows}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict, name: str) -> "PhoneticIndex":
+        return cls(arrays[f'{name}.hashes'], arrays[f'{name}.starts'], arrays[f'{name}.counts'], arrays[f'{name}.rows'])
+
+    def lookup(self, key: str) -> np.ndarray:
+        # Lignes dont la clé phonétique est `key`, triées
+        size = len(self.hashes)
+        key_hash = self.hash(key)
+        slot = key_hash & (size - 1)
+        while key and self.hashes[slot]:
+            if self.hashes[slot] == key_hash:
+                start = int(self.starts[slot])
+                return self.rows[start:start + int(self.counts[slot])].astype(np.uintp)
+            slot = (slot + 1) & (size - 1)
+        return np.empty(0, dtype=np.uintp)
+
+
+def phonetic_keys(country: str, names, folded: list) -> list:
+    # Clés phonétiques de chaque nom : celle de son repli, et celle de phonetic_fold quand elle en
+    # diffère (noms avec ç)
+    keys = []
+    for name, folded_name in zip(names, folded):
+        key = phonetic_key(country, folded_name)
+        if PHONETIC_CHARS.isdisjoint(name):
+            keys.append((key,))
+        else:
+            keys.append((key, phonetic_key(country, phonetic_fold(name))))
+    return keys
+
+
+class CommuneStore:
+    # Données d'un pays, toutes dans des tableaux numpy (mappables en mémoire depuis le cache) :
+    # les noms en arène de chaînes, Pays et dep_code en codes entiers, les noms repliés (voir fold)
+    # et les index de recherche. Les lignes en double dans le CSV ne sont gardées qu'une fois.
+    COLUMNS = ('Pays', 'nom_standard', 'dep_code')
+    CODED_COLUMNS = ('Pays', 'dep_code')
+    # Clés de tri précalculées : rang du nom et du département (rangs denses, égaux pour des valeurs
+    # égales, celui du département étant son code), et longueur du nom en caractères
+    SORT_KEYS = ('name', 'length', 'dep_code')
+
+    def __init__(self, country: str, columns: dict, sort_keys: dict, folded: CodepointColumn, prefixes: SortedNames, suffixes: SortedNames,
+                 trigrams: TrigramIndex, phonetic: PhoneticIndex):
+        self.country = country
+        self.columns = columns
+        self.sort_keys = sort_keys
+        # Noms repliés en points de code, pour les parcours en C (une seule comparaison par nom)
+        self.folded = folded
+        # Noms repliés (UTF-8) triés, à l'endroit et à l'envers, pour "Commencant par",
+        # "Finissant par" et les lettres suivantes possibles
+        self.prefixes = prefixes
+        self.suffixes = suffixes
+        self.trigrams = trigrams
+        # Clés phonétiques des noms (schéma propre au pays), pour la recherche "Phonétique"
+        self.phonetic = phonetic
+
+    @classmethod
+    def from_frame(cls, df: "pandas.DataFrame", country: str) -> "CommuneStore":
+        # pandas n'est importé que pour construire un pays depuis son CSV, pas pour le charger du cache
+        import pandas as pd
+        df = df.drop_duplicates(subset=list(cls.COLUMNS), ignore_index=True)
+        columns = {column: CodedColumn.from_strings(df[column].values) if column in cls.CODED_COLUMNS
+                   else NameColumn.from_strings(df[column].values) for column in cls.COLUMNS}
+        name_ranks, names = pd.factorize(df['nom_standard'], sort=True)
+        sort_keys = {
+            'name': name_ranks.astype(small_int_type(len(names) - 1)),
+            'length': df['nom_standard'].str.len().to_numpy(dtype=np.uint16),
+            'dep_code': columns['dep_code'].codes,
+        }
+        folded = [fold(name) for name in df['nom_standard'].values]
+        folded_utf8 = NameColumn.from_strings(folded)
+        return cls(country, columns, sort_keys, CodepointColumn.from_strings(folded),
+                   SortedNames(folded_utf8), SortedNames(folded_utf8.reversed()),
+                   TrigramIndex.build([folded_utf8]),
+                   PhoneticIndex.build(phonetic_keys(country, df['nom_standard'].values, folded)))
+
+    def arrays(self) -> dict:
+        arrays = {}
+        for name, column in self.columns.items():
+            arrays.update(column.arrays(name))
+        for name in ('name', 'length'):
+            arrays[f'sort.{name}'] = self.sort_keys[name]
+        arrays.update(self.folded.arrays('folded'))
+        arrays.update(self.prefixes.arrays('prefix'))
+        arrays.update(self.suffixes.arrays('suffix'))
+        arrays.update(self.trigrams.arrays('trigrams'))
+        arrays.update(self.phonetic.arrays('phonetic'))
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: dict, country: str) -> "CommuneStore":
+        columns = {name: CodedColumn.from_arrays(arrays, name) if name in cls.CODED_COLUMNS
+                   else NameColumn.from_arrays(arrays, name) for name in cls.COLUMNS}
+        sort_keys = {'name': arrays['sort.name'], 'length': arrays['sort.length'], 'dep_code': columns['dep_code'].codes}
+        return cls(country, columns, sort_keys, CodepointColumn.from_arrays(arrays, 'folded'),
+                   SortedNames.from_arrays(arrays, 'prefix'),
+                   SortedNames.from_arrays(arrays, 'suffix'),
+                   TrigramIndex.from_arrays(arrays, 'trigrams'),
+                   PhoneticIndex.from_arrays(arrays, 'phonetic'))
+
+    def save(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, array in self.arrays().items():
+            np.save(directory / f'{name}.npy', np.ascontiguousarray(array))
+
+    @classmethod
+    def load(cls, directory: Path, country: str) -> "CommuneStore":
+        # Les tableaux sont mappés en mémoire : seules les pages lues sont chargées
+        arrays = {path.name[:-len('.npy')]: np.load(path, mmap_mode='r') for path in directory.glob('*.npy')}
+        return cls.from_arrays(arrays, country)
+
+    def __len__(self) -> int:
+        return len(self.columns['nom_standard'])
+
+    def frame(self, rows: np.ndarray) -> dict:
+        # Colonnes affichées des lignes `rows`
+        return {column: self.columns[column].take(rows) for column in self.COLUMNS}
+
+    def distinct_values(self, key: str) -> list:
+        # Valeurs distinctes de la colonne triée par `key` ('name' ou 'dep_code'), dans l'ordre des rangs
+        if key == 'dep_code':
+            return self.columns['dep_code'].distinct()
+        ranks = np.asarray(self.sort_keys[key])
+        order = np.argsort(ranks, kind='stable')
+        first_rows = order[np.append(True, ranks[order][1:] != ranks[order][:-1])] if len(order) else order
+        return self.columns['nom_standard'].take(first_rows)
+
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.arrays().values())
+
+    # Les requêtes passées aux méthodes suivantes sont déjà repliées (voir fold, et phonetic_fold pour sounding_like)
+    def starting_with(self, query: str) -> np.ndarray:
+        return np.sort(self.prefixes.starting_with(query.encode('utf-8')))
+
+    def ending_with(self, query: str) -> np.ndarray:
+        return np.sort(self.suffixes.starting_with(query.encode('utf-8')[::-1]))
+
+    def containing_candidates(self, query: str) -> np.ndarray:
+        return self.trigrams.candidates(query.encode('utf-8'))
+
+    def sounding_like(self, query: str) -> np.ndarray:
+        return self.phonetic.lookup(phonetic_key(self.country, query))
+
+    def next_letters(self, query: str) -> str:
+        return self.prefixes.next_letters(query.encode('utf-8'))
+
+    def filter(self, query: str, search_type: str, rows: np.ndarray = None, cancel=None) -> np.ndarray:
+        # Lignes (parmi `rows`, toutes si None) dont le nom replié correspond à `query`
+        query_codepoints = codepoints(query)
+        rows_count = len(self) if rows is None else len(rows)
+        matches = np.empty(rows_count, dtype=np.uintp)
+        matches_count = functions_lib.filter_df(self.folded.arena_ptr, self.folded.offsets_ptr,
+                                                None if rows is None else rows.ctypes.data_as(size_t_p), rows_count,
+                                                query_codepoints.ctypes.data, len(query_codepoints),
+                                                search_type.encode('utf-8'), matches.ctypes.data_as(size_t_p), cancel)
+        return matches[:matches_count]
+
+
+class StoreView:
+    # Vue sur les pays sélectionnés, sans copie : la ligne `base + i` de la vue est la ligne i
+    # du pays commençant à `base`
+    def __init__(self, stores: list):
+        self.stores = []
+        base = 0
+        for store in stores:
+            self.stores.append((store, base))
+            base += len(store)
+        self.length = base
+        self.keys = {}
+
+    def sort_key(self, key: str) -> np.ndarray:
+        # Clé de tri `key` (voir CommuneStore.SORT_KEYS) de chaque ligne de la vue, comparable entre
+        # pays : les rangs de chaque pays sont renumérotés sur l'union de leurs valeurs (une fois par vue)
+        if key not in self.keys:
+            if len(self.stores) == 1 or key == 'length':
+                values = [np.asarray(store.sort_keys[key]) for store, _ in self.stores]
+            else:
+                distinct = [store.distinct_values(key) for store, _ in self.stores]
+                ranks = {value: rank for rank, value in enumerate(sorted(set().union(*distinct)))}
+                values = [np.array([ranks[value] for value in store_distinct], dtype=np.uint32)[store.sort_keys[key]]
+                          for (store, _), store_distinct in zip(self.stores, distinct)]
+            self.keys[key] = np.concatenate(values) if values else np.empty(0, dtype=np.uint32)
+        return self.keys[key]
+
+    def __len__(self) -> int:
+        return self.length
+
+    def countries(self) -> tuple:
+        return tuple(store.country for store, _ in self.stores)
+
+    def split(self, rows: np.ndarray):
+        # (pays, base, masque des lignes de `rows` de ce pays, lignes locales) pour chaque pays
+        for store, base in self.stores:
+            mask = (rows >= base) & (rows < base + len(store))
+            if mask.any():
+                yield store, base, mask, np.ascontiguousarray(rows[mask] - base, dtype=np.uintp)
+
+    def frame(self, rows: np.ndarray) -> dict:
+        # Colonnes (Pays, nom_standard, dep_code) des lignes `rows`, dans cet ordre, en listes
+        rows = np.asarray(rows, dtype=np.uintp)
+        columns = {column: np.empty(len(rows), dtype=object) for column in CommuneStore.COLUMNS}
+        for store, _, mask, local_rows in self.split(rows):
+            for column, values in store.frame(local_rows).items():
+                columns[column][mask] = values
+        return {column: values.tolist() for column, values in columns.items()}
+
+
+def read_communes_csv(filepath: str) -> "pandas.DataFrame":
+    # Pays,nom_standard,nom_sans_accent,nom_standard_majuscule,dep_code : seules les colonnes
+    # affichées sont lues, les autres formes des noms sont remplacées par fold
+    import pandas as pd
+    dtype = {column: str for column in CommuneStore.COLUMNS}
+    df = pd.DataFrame(columns=list(CommuneStore.COLUMNS))
+    if os.path.exists(filepath):
+        read = pd.read_csv(filepath, usecols=list(CommuneStore.COLUMNS), dtype=dtype, keep_default_na=False)
+        df = pd.concat([df, read], ignore_index=True)  # ensure index is reset
+    else:
+        print(f"File not found: {filepath}")
+    return df
+
+
+def file_sha256(filepath: str) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_meta(meta_path: Path, meta: dict) -> None:
+    # Écrit dans un fichier temporaire puis renommé : un lecteur ne voit jamais un meta.json partiel
+    temporary = meta_path.with_name(f'.{meta_path.name}.{os.getpid()}')
+    temporary.write_text(json.dumps(meta))
+    os.replace(temporary, meta_path)
+
+
+def save_store(store: "CommuneStore", directory: Path, meta: dict) -> None:
+    # Le cache est écrit dans un répertoire temporaire à côté de `directory` (meta.json en dernier),
+    # qui remplace ensuite l'ancien par renommage. Les fichiers de l'ancien cache ne sont jamais
+    # réécrits : les instances qui les ont mappés en mémoire continuent de les lire.
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    building = Path(tempfile.mkdtemp(prefix=f'.{directory.name}-', dir=directory.parent))
+    try:
+        store.save(building)
+        write_meta(building / 'meta.json', meta)
+        previous = Path(tempfile.mkdtemp(prefix=f'.{directory.name}-old-', dir=directory.parent))
+        try:
+            os.replace(directory, previous / directory.name)
+        except FileNotFoundError:
+            pass
+        try:
+            os.replace(building, directory)
+        except OSError:
+            # Un autre processus a installé son cache entre-temps (construit depuis le même CSV)
+            pass
+        shutil.rmtree(previous, ignore_errors=True)
+    finally:
+        shutil.rmtree(building, ignore_errors=True)
+
+
+def load_store(filepath: str, cache_dir: str = CACHE_DIR) -> CommuneStore:
+    # Charge un pays depuis son cache binaire, reconstruit à partir du CSV si celui-ci a changé
+    # (date de modification différente et contenu différent)
+    country = Path(filepath).stem
+    if not os.path.exists(filepath):
+        return CommuneStore.from_frame(read_communes_csv(filepath), country)
+
+    directory = Path(cache_dir) / country
+    meta_path = directory / 'meta.json'
+    stat = os.stat(filepath)
+    try:
+        meta = json.loads(meta_path.read_text())
+    except (OSError, ValueError):
+        meta = {}
+    if meta.get('version') == CACHE_VERSION:
+        unchanged = meta.get('mtime_ns') == stat.st_mtime_ns and meta.get('size') == stat.st_size
+        if not unchanged and meta.get('sha256') == file_sha256(filepath):
+            meta.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+            write_meta(meta_path, meta)
+            unchanged = True
+        if unchanged:
+            try:
+                return CommuneStore.load(directory, country)
+            except (OSError, KeyError):
+                pass  # Cache remplacé pendant la lecture par un autre processus : reconstruit
+
+    store = CommuneStore.from_frame(read_communes_csv(filepath), country)
+    save_store(store, directory, {'version': CACHE_VERSION, 'mtime_ns': stat.st_mtime_ns,
+                                  'size': stat.st_size, 'sha256': file_sha256(filepath)})
+    return store
+
+if __name__ == "__main__":
+    # Conversion des CSV en cache binaire : python src/store.py [communes/France.csv ...]
+    import sys
+    for filepath in sys.argv[1:] or sorted(str(path) for path in Path('./communes').glob('*.csv')):
+        store = load_store(filepath)
+        print(filepath, len(store), f"{store.nbytes() / 2**20:.1f} MiB")
+    # Mémoire du processus (Linux) : les tableaux mappés sont comptés dans RssFile, partagé entre instances
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as status:
+            print(', '.join(' '.join(line.split()) for line in status if line.startswith(('VmRSS', 'RssAnon', 'RssFile'))))
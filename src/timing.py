@@ -0,0 +1,37 @@
+import threading
+import time
+
+
+class StageTimer:
+    # Temps cumulés par étape d'une recherche (filtre, correction, distances, tri, rendu...).
+    # Les appelants ne mesurent que si un StageTimer est installé : désactivé, il ne coûte qu'un test.
+    #     if timer:
+    #         started = time.perf_counter()
+    #     ...
+    #     if timer:
+    #         started = timer.lap('filter', started)
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}  # étape -> [nombre, temps total (s), temps max (s)]
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self.lock:
+            entry = self.stages.setdefault(stage, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def lap(self, stage: str, started: float) -> float:
+        # Ajoute le temps écoulé depuis `started` à `stage` et retourne l'instant présent
+        now = time.perf_counter()
+        self.add(stage, now - started)
+        return now
+
+    def reset(self) -> None:
+        with self.lock:
+            self.stages.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {stage: {'count': count, 'total_ms': total * 1000, 'mean_ms': total * 1000 / count, 'max_ms': longest * 1000}
+                    for stage, (count, total, longest) in self.stages.items()}
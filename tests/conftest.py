@@ -0,0 +1,18 @@
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+sys.path.insert(0, str(ROOT))
+
+# La bibliothèque C est compilée (si besoin) comme au lancement, avant l'import de native
+from launch import compile_c_code
+
+_cwd = os.getcwd()
+os.chdir(ROOT)
+try:
+    if not compile_c_code():
+        raise RuntimeError("Compilation of src/functions.c failed")
+finally:
+    os.chdir(_cwd)
@@ -0,0 +1,98 @@
+# Filtres (index de trigrammes, intervalles des noms triés, table phonétique, résultats en cache
+# réutilisés pour une requête plus longue) et lettres suivantes, comparés à un parcours de tous
+# les noms repliés.
+import numpy as np
+import pytest
+
+from engine import SEARCH_TYPES, SearchEngine
+from phonetic import phonetic_key
+from store import fold, phonetic_fold
+
+COUNTRY_COMBINATIONS = [('France',), ('Allemagne',), ('Suisse',), ('France', 'Allemagne', 'Suisse'), ('Suisse', 'France')]
+
+QUERIES = ['', 'a', 'x', 'sa', 'Saint', 'Saint-É', "l'", 'bourg', 'ber', 'ngen', 'ü', 'Zürich', 'Besançon',
+           'Nantes', 'œuvre', 'zzz', 'e-s']
+
+# Requêtes tapées lettre par lettre (et corrigées) : chacune peut réutiliser le résultat de la précédente
+TYPED = ['S', 'St', 'Str', 'Stra', 'Stras', 'Strasb', 'Stra', 'Stras', 'Strass', 'a', 'an', 'ang', 'ange', 'anger',
+         'e', 'en', 'ene', 'n', 'ng', 'nge', 'ngen']
+
+
+@pytest.fixture(scope='module')
+def engine() -> SearchEngine:
+    return SearchEngine()
+
+
+@pytest.fixture(scope='module')
+def names(engine) -> dict:
+    # Pays -> [(nom replié, clés phonétiques), ...], dans l'ordre des lignes
+    names = {}
+    for country in engine.countries:
+        store = engine.load(country)
+        names[country] = [(folded, {phonetic_key(country, folded), phonetic_key(country, phonetic_fold(name.decode('utf-8')))})
+                          for name, folded in zip(store.columns['nom_standard'].values(), store.folded.values())]
+    return names
+
+
+def reference_rows(names: dict, countries: tuple, query: str, mode: str) -> list:
+    rows, base = [], 0
+    folded_query = fold(query)
+    for country in countries:
+        key = phonetic_key(country, phonetic_fold(query))
+        for row, (folded, keys) in enumerate(names[country]):
+            if mode == "Commencant par":
+                matches = folded.startswith(folded_query)
+            elif mode == "Finissant par":
+                matches = folded.endswith(folded_query)
+            elif mode == "Contenant":
+                matches = folded_query in folded
+            else:
+                matches = bool(key) and key in keys
+            if matches:
+                rows.append(base + row)
+        base += len(names[country])
+    return rows
+
+
+def reference_letters(names: dict, countries: tuple, query: str) -> list:
+    folded_query = fold(query)
+    letters = set()
+    for country in countries:
+        for folded, _ in names[country]:
+            if folded.startswith(folded_query) and len(folded) > len(folded_query):
+                letters.add(folded[len(folded_query)])
+    return sorted(letters)
+
+
+@pytest.mark.parametrize('countries', COUNTRY_COMBINATIONS)
+@pytest.mark.parametrize('mode', SEARCH_TYPES)
+def test_filter_rows(engine, names, countries, mode):
+    view = engine.view_for(countries)
+    for query in QUERIES:
+        with engine.filter_cache_lock:
+            engine.filter_cache.clear()
+        rows = engine.filter_rows(query, mode, view=view)
+        assert np.sort(rows).tolist() == reference_rows(names, countries, query, mode), query
+
+
+@pytest.mark.parametrize('countries', COUNTRY_COMBINATIONS)
+def test_next_letters(engine, names, countries):
+    view = engine.view_for(countries)
+    for query in QUERIES + TYPED:
+        if query:
+            assert engine.next_letters(query, view) == reference_letters(names, countries, query), query
+
+
+@pytest.mark.parametrize('countries', COUNTRY_COMBINATIONS)
+@pytest.mark.parametrize('mode', SEARCH_TYPES)
+def test_cached_superset(engine, countries, mode):
+    # Même lignes, dans le même ordre, que la requête soit filtrée depuis un résultat en cache ou non
+    uncached = SearchEngine(filter_cache_size=0)
+    uncached.loaded_stores = engine.loaded_stores
+    cached = SearchEngine()
+    cached.loaded_stores = engine.loaded_stores
+    cached_view, uncached_view = cached.view_for(countries), uncached.view_for(countries)
+    for query in TYPED:
+        rows = cached.filter_rows(query, mode, view=cached_view)
+        assert rows.tolist() == uncached.filter_rows(query, mode, view=uncached_view).tolist(), query
+    assert not uncached.filter_cache
@@ -0,0 +1,120 @@
+# Test différentiel des distances C (Myers sur 64 bits, DP bornée au-delà) contre une DP Python
+# sur les noms repliés des CSV fournis, plus quelques noms hors Latin-1.
+import random
+
+import numpy as np
+import pytest
+
+from engine import SearchEngine
+from native import functions_lib, size_t_p
+from store import CodepointColumn, codepoints
+
+MYERS_MAX_LEN = 64
+
+QUERIES = [
+    '',
+    'a',
+    'paris',
+    'saint-etienne',
+    'zürich',
+    'łódź',
+    'œuvre-中文',
+    'strasbourgg',
+    ('saint-' * 11)[:63],
+    ('saint-' * 11)[:64],
+    ('saint-' * 11)[:65],
+    ('gdańsk-' * 10)[:64],
+    ('gdańsk-' * 10)[:65],
+    ''.join(chr(0x100 + i) for i in range(64)),  # 64 points de code distincts >= 256
+    ''.join(chr(0x100 + i) for i in range(65)),
+]
+
+EXTRA_NAMES = ['łódź', 'gdańsk', 'gdansk', 'œuvre', '中文', '', 'a', ('saint-' * 11)[:64], ('gdańsk-' * 10)[:66],
+               ''.join(chr(0x100 + i) for i in range(60))]
+
+
+def reference_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, char in enumerate(a, start=1):
+        current = [i]
+        for j, other in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+        previous = current
+    return previous[-1]
+
+
+@pytest.fixture(scope='module')
+def names() -> list:
+    # Assez de noms pour que les parcours soient découpés entre plusieurs threads
+    engine = SearchEngine()
+    bundled = []
+    for country in engine.countries:
+        bundled.extend(engine.load(country).folded.values())
+    sample = random.Random(0).sample(bundled, min(len(bundled), 9000))
+    return sample + EXTRA_NAMES
+
+
+@pytest.fixture(scope='module', autouse=True)
+def threads():
+    previous = functions_lib.get_thread_count()
+    functions_lib.set_thread_count(2)
+    yield
+    functions_lib.set_thread_count(previous)
+
+
+@pytest.fixture(scope='module')
+def expected(names) -> dict:
+    return {query: np.array([reference_distance(name, query) for name in names]) for query in QUERIES}
+
+
+def final_distances(column: CodepointColumn, query: str, rows: np.ndarray = None) -> np.ndarray:
+    query_codepoints = codepoints(query)
+    count = len(column) if rows is None else len(rows)
+    distances = np.zeros(count, dtype=np.uintp)
+    functions_lib.calculate_final_distances(column.arena_ptr, column.offsets_ptr,
+                                            None if rows is None else rows.ctypes.data_as(size_t_p), count,
+                                            query_codepoints.ctypes.data, len(query_codepoints),
+                                            distances.ctypes.data_as(size_t_p), None)
+    return distances
+
+
+def nearest(column: CodepointColumn, query: str, max_distance: int, k: int, rows: np.ndarray = None) -> tuple:
+    query_codepoints = codepoints(query)
+    top_rows = np.empty(k, dtype=np.uintp)
+    top_distances = np.empty(k, dtype=np.uintp)
+    count = functions_lib.calculate_nearest(column.arena_ptr, column.offsets_ptr,
+                                            None if rows is None else rows.ctypes.data_as(size_t_p),
+                                            len(column) if rows is None else len(rows),
+                                            query_codepoints.ctypes.data, len(query_codepoints), max_distance, k,
+                                            top_rows.ctypes.data_as(size_t_p), top_distances.ctypes.data_as(size_t_p), None)
+    return top_rows[:count].tolist(), top_distances[:count].tolist()
+
+
+def test_queries_cover_both_algorithms():
+    lengths = {len(query) for query in QUERIES}
+    assert {0, MYERS_MAX_LEN - 1, MYERS_MAX_LEN, MYERS_MAX_LEN + 1} <= lengths
+    assert any(ord(char) >= 256 for query in QUERIES for char in query)
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_final_distances(names, expected, query):
+    column = CodepointColumn.from_strings(names)
+    assert final_distances(column, query).tolist() == expected[query].tolist()
+
+    rows = np.ascontiguousarray(np.arange(len(names))[::-3], dtype=np.uintp)
+    assert final_distances(column, query, rows).tolist() == expected[query][rows.astype(np.int64)].tolist()
+
+
+@pytest.mark.parametrize('query', QUERIES)
+@pytest.mark.parametrize('max_distance, k', [(15, 20), (4, 1000), (100, 5)])
+def test_nearest(names, expected, query, max_distance, k):
+    column = CodepointColumn.from_strings(names)
+    distances = expected[query]
+    # Les k plus proches sous max_distance, à égalité par ligne
+    order = [row for row in np.lexsort((np.arange(len(names)), distances)) if distances[row] < max_distance][:k]
+    assert nearest(column, query, max_distance, k) == ([int(row) for row in order], distances[order].tolist())
+
+    rows = np.ascontiguousarray(np.arange(1, len(names), 2), dtype=np.uintp)
+    order = [row for row in rows[np.lexsort((rows, distances[rows.astype(np.int64)]))]
+             if distances[row] < max_distance][:k]
+    assert nearest(column, query, max_distance, k, rows) == ([int(row) for row in order], distances[order].tolist())